@@ -1,19 +1,59 @@
 from pathlib import Path
 
+import telemetry
+from gdal_profiles import gtiff_creation_options
+from activities.overviews import cog_options, DEFAULT_OVERVIEW_RESAMPLING, DEFAULT_OVERVIEW_LEVELS
 
-def compose_tiff(input_tiffs: list[str]) -> Path:
+
+def compose_tiff(input_tiffs: list[str],
+                 output_name="composed_output.tif",
+                 cache_mb=None,
+                 num_threads=None,
+                 overviews=True,
+                 compress=None,
+                 overview_resampling=DEFAULT_OVERVIEW_RESAMPLING,
+                 overview_levels=DEFAULT_OVERVIEW_LEVELS,
+                 work_dir=None) -> Path:
+    """
+    Mosaic `input_tiffs` into a single tiled GeoTIFF.
+
+    The mosaic is described by an in-memory VRT and materialized block by
+    block, so memory is bounded by the block cache rather than by the mosaic
+    size. With `overviews` the COG driver builds the overview pyramid as part
+    of the same write. `cache_mb` and `num_threads` override the active GDAL
+    profile's GDAL_CACHEMAX and GDAL_NUM_THREADS for this call only.
+    """
     import os
+    import uuid
     import tempfile
     from osgeo import gdal
 
-    temp_dir = tempfile.mkdtemp(prefix="compose_tif_")
-    output_tiff = Path(temp_dir).joinpath("composed_output.tif")
+    temp_dir = tempfile.mkdtemp(prefix="compose_tif_", dir=work_dir)
+    output_tiff = Path(temp_dir).joinpath(output_name)
 
     vrt_options = gdal.BuildVRTOptions(resampleAlg='nearest')
-    vrt_path = tempfile.NamedTemporaryFile(suffix=".vrt", delete=False).name
-    gdal.BuildVRT(vrt_path, input_tiffs, options=vrt_options)
+    vrt_path = f"/vsimem/compose_{uuid.uuid4().hex}.vrt"
+
+    if overviews:
+        translate_options = cog_options(overview_resampling, overview_levels, compress, num_threads)
+    else:
+        translate_options = {"format": "GTiff", "creationOptions": gtiff_creation_options(compress, num_threads)}
+
+    overrides = {}
+    if cache_mb is not None:
+        overrides["GDAL_CACHEMAX"] = str(cache_mb)
+    if num_threads is not None:
+        overrides["GDAL_NUM_THREADS"] = str(num_threads)
+
+    with gdal.config_options(overrides):
+        vrt_ds = gdal.BuildVRT(vrt_path, input_tiffs, options=vrt_options)
+        telemetry.observe_raster(vrt_ds.RasterXSize, vrt_ds.RasterYSize, vrt_ds.RasterCount)
+        try:
+            gdal.Translate(str(output_tiff), vrt_ds, **translate_options)
+        finally:
+            vrt_ds = None
+            gdal.Unlink(vrt_path)
 
-    gdal.Translate(str(output_tiff), vrt_path, format="GTiff")
     print(f"Composed TIFF saved to {output_tiff}")
 
     return output_tiff
@@ -2,14 +2,46 @@ import logging
 import tempfile
 from pathlib import Path
 
+import telemetry
+from gdal_profiles import gtiff_creation_options
+from activities.overviews import to_cloud_optimized, DEFAULT_OVERVIEW_LEVELS
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
-def convert_hdf_to_geotiff(hdf_file: str, required_dataset="Fpar_500m") -> Path:
+# Rows converted per block; bounds peak memory to roughly chunk_rows * cols * 4 bytes.
+DEFAULT_CHUNK_ROWS = 512
+
+# MODIS tile grids are defined on a sphere, not the WGS84 ellipsoid; using the
+# ellipsoid shifts positions by kilometres at mid latitudes.
+MODIS_SINUSOIDAL_PROJ4 = "+proj=sinu +lon_0=0 +x_0=0 +y_0=0 +R=6371007.181 +units=m +no_defs"
+
+# Extra pixels kept around the AOI window so edge pixels survive rounding and resampling.
+AOI_WINDOW_BUFFER_PIXELS = 2
+
+
+def convert_hdf_to_geotiff(hdf_file: str,
+                           required_dataset="Fpar_500m",
+                           chunk_rows=DEFAULT_CHUNK_ROWS,
+                           aoi_bbox=None,
+                           aoi_geometry_wkt=None,
+                           overview_resampling=None,
+                           overview_levels=DEFAULT_OVERVIEW_LEVELS,
+                           work_dir=None) -> Path | None:
+    """
+    Convert one SDS of an HDF4 file to a Float32 GeoTIFF.
+
+    With `aoi_bbox` (EPSG:4326) only the pixel window covering the AOI is read
+    and written. With `aoi_geometry_wkt` (EPSG:4326) pixels outside the
+    polygon are additionally set to nodata. With `overview_resampling` the
+    output is rewritten as a COG with internal overviews. Returns None, writing
+    nothing, when the granule's tile does not overlap `aoi_bbox`; neighbouring tiles
+    often match a lat/lon footprint search without covering any AOI pixel.
+    """
     import os
-    from osgeo import gdal
+    from osgeo import gdal, osr
     from pyhdf.SD import SD, SDC
     import numpy as np
 
@@ -25,16 +57,17 @@ def convert_hdf_to_geotiff(hdf_file: str, required_dataset="Fpar_500m") -> Path:
         logger.error(error_msg)
         raise ValueError(error_msg)
 
-    # Select the dataset
+    # Select the dataset; data is read block by block further down
     selected_dataset = hdf.select(required_dataset)
-    data = selected_dataset.get()
+    _, _, dims, _, _ = selected_dataset.info()
+    rows, cols = dims
 
     # Get attributes for georeference information
     attributes = selected_dataset.attributes()
 
     # Create temporary file for GeoTIFF output
     original_hdf_file_name = os.path.splitext(os.path.basename(hdf_file))[0]
-    temp_dir = tempfile.mkdtemp(prefix="hdf_to_tif_")
+    temp_dir = tempfile.mkdtemp(prefix="hdf_to_tif_", dir=work_dir)
     output_geotiff = Path(temp_dir).joinpath(f"{original_hdf_file_name}.tif")
 
     # Get spatial metadata from the global attributes if available
@@ -68,18 +101,17 @@ def convert_hdf_to_geotiff(hdf_file: str, required_dataset="Fpar_500m") -> Path:
             ul_x, ul_y = float(ul_match.group(1)), float(ul_match.group(2))
             lr_x, lr_y = float(lr_match.group(1)), float(lr_match.group(2))
 
-            # Get dimensions
-            x_dim, y_dim = data.shape
-
             # Calculate pixel size
-            pixel_width = (lr_x - ul_x) / x_dim
-            pixel_height = (ul_y - lr_y) / y_dim
+            pixel_width = (lr_x - ul_x) / cols
+            pixel_height = (ul_y - lr_y) / rows
 
             # Create geotransform: (ulx, pixel_width, 0, uly, 0, -pixel_height)
             geo_transform = (ul_x, pixel_width, 0, ul_y, 0, -pixel_height)
 
-            # Set projection - typically MODIS uses sinusoidal projection
-            projection = 'PROJCS["Sinusoidal",GEOGCS["GCS_WGS_1984",DATUM["WGS_1984",SPHEROID["WGS_84",6378137,298.257223563]],PRIMEM["Greenwich",0],UNIT["Degree",0.017453292519943295]],PROJECTION["Sinusoidal"],PARAMETER["longitude_of_center",0],PARAMETER["false_easting",0],PARAMETER["false_northing",0],UNIT["Meter",1]]'
+            # MODIS sinusoidal grid on its reference sphere
+            modis_srs = osr.SpatialReference()
+            modis_srs.ImportFromProj4(MODIS_SINUSOIDAL_PROJ4)
+            projection = modis_srs.ExportToWkt()
 
     # If we couldn't extract geotransform, use a default one (this is just a fallback)
     if not geo_transform:
@@ -87,27 +119,30 @@ def convert_hdf_to_geotiff(hdf_file: str, required_dataset="Fpar_500m") -> Path:
         geo_transform = (-180.0, 0.005, 0.0, 90.0, 0.0, -0.005)  # Default global extent
         projection = 'GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563]],PRIMEM["Greenwich",0],UNIT["degree",0.0174532925199433]]'
 
-    # Replace fill values with NaN
-    if '_FillValue' in attributes:
-        fill_value = attributes['_FillValue']
-        data = np.where(data == fill_value, np.nan, data)
-
-    # Apply scale factor if present
-    if 'scale_factor' in attributes:
-        scale_factor = attributes['scale_factor']
-        data = data * scale_factor
-
-    # Apply offset if present
-    if 'add_offset' in attributes:
-        add_offset = attributes['add_offset']
-        data = data + add_offset
+    # Restrict to the AOI's pixel window and shift the origin to its top-left corner
+    row_off, col_off = 0, 0
+    if aoi_bbox is not None:
+        window = aoi_window(aoi_bbox, geo_transform, projection, rows, cols)
+        if window is None:
+            logger.info(f"Skipping {hdf_file}: its tile does not overlap the AOI")
+            selected_dataset.endaccess()
+            hdf.end()
+            return None
+        row_off, col_off, rows, cols = window
+        geo_transform = (geo_transform[0] + col_off * geo_transform[1], geo_transform[1], 0,
+                         geo_transform[3] + row_off * geo_transform[5], 0, geo_transform[5])
+        logger.info(f"Cropping to AOI window rows {row_off}..{row_off + rows}, cols {col_off}..{col_off + cols}")
+    telemetry.observe_raster(cols, rows)
+
+    fill_value = attributes.get('_FillValue')
+    scale_factor = attributes.get('scale_factor')
+    add_offset = attributes.get('add_offset')
 
     # Create the GeoTIFF file
     driver = gdal.GetDriverByName('GTiff')
-    rows, cols = data.shape
 
     # Create the output dataset
-    dst_ds = driver.Create(str(output_geotiff), cols, rows, 1, gdal.GDT_Float32)
+    dst_ds = driver.Create(str(output_geotiff), cols, rows, 1, gdal.GDT_Float32, options=gtiff_creation_options())
 
     # Set geotransform and projection
     dst_ds.SetGeoTransform(geo_transform)
@@ -117,17 +152,92 @@ def convert_hdf_to_geotiff(hdf_file: str, required_dataset="Fpar_500m") -> Path:
     band = dst_ds.GetRasterBand(1)
     band.SetNoDataValue(np.nan)
 
-    # Write data to the band
-    band.WriteArray(data)
+    # Convert and write row blocks through one reused float32 buffer: replace fill
+    # values with NaN, then apply scale and offset in place.
+    buffer = np.empty((min(chunk_rows, rows), cols), dtype=np.float32)
+    for row_start in range(0, rows, chunk_rows):
+        row_count = min(chunk_rows, rows - row_start)
+        raw = selected_dataset.get(start=(row_off + row_start, col_off), count=(row_count, cols))
+        block = buffer[:row_count]
+
+        np.copyto(block, raw, casting='unsafe')
+        if fill_value is not None:
+            block[raw == fill_value] = np.nan
+        if scale_factor is not None:
+            np.multiply(block, scale_factor, out=block, casting='unsafe')
+        if add_offset is not None:
+            np.add(block, add_offset, out=block, casting='unsafe')
+
+        band.WriteArray(block, 0, row_start)
+
+    if aoi_geometry_wkt is not None:
+        mask_outside_geometry(dst_ds, aoi_geometry_wkt)
 
     # Flush data to disk
     band.FlushCache()
     dst_ds = None  # Close the dataset
+    selected_dataset.endaccess()
+    hdf.end()
+
+    if overview_resampling is not None:
+        to_cloud_optimized(output_geotiff, overview_resampling, overview_levels)
 
     logger.info(f"Successfully converted HDF to GeoTIFF: {output_geotiff}")
 
     return output_geotiff
 
 
+def aoi_window(aoi_bbox, geo_transform, projection: str, rows: int, cols: int,
+               buffer_pixels=AOI_WINDOW_BUFFER_PIXELS) -> tuple[int, int, int, int] | None:
+    """
+    Pixel window (row_off, col_off, rows, cols) of the raster covering an EPSG:4326 bbox,
+    grown by `buffer_pixels` on every side and clipped to the raster, or None when the
+    bbox does not overlap the raster.
+    """
+    import math
+    from osgeo import osr
+
+    src_srs = osr.SpatialReference()
+    src_srs.ImportFromEPSG(4326)
+    src_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    dst_srs = osr.SpatialReference()
+    dst_srs.ImportFromWkt(projection)
+    dst_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+    # Densified edges: a lat/lon box is curved in sinusoidal space
+    transform = osr.CoordinateTransformation(src_srs, dst_srs)
+    minx, miny, maxx, maxy = transform.TransformBounds(*aoi_bbox, 21)
+
+    origin_x, pixel_width, _, origin_y, _, pixel_height = geo_transform
+    col_start = max(0, math.floor((minx - origin_x) / pixel_width) - buffer_pixels)
+    col_end = min(cols, math.ceil((maxx - origin_x) / pixel_width) + buffer_pixels)
+    row_start = max(0, math.floor((maxy - origin_y) / pixel_height) - buffer_pixels)
+    row_end = min(rows, math.ceil((miny - origin_y) / pixel_height) + buffer_pixels)
+
+    if col_end <= col_start or row_end <= row_start:
+        return None
+
+    return row_start, col_start, row_end - row_start, col_end - col_start
+
+
+def mask_outside_geometry(dst_ds, geometry_wkt: str):
+    """Set pixels of band 1 outside an EPSG:4326 geometry to the band's nodata value."""
+    from osgeo import gdal, ogr, osr
+
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+    mem_ds = ogr.GetDriverByName("Memory").CreateDataSource("aoi")
+    layer = mem_ds.CreateLayer("aoi", srs, ogr.wkbUnknown)
+    feature = ogr.Feature(layer.GetLayerDefn())
+    feature.SetGeometry(ogr.CreateGeometryFromWkt(geometry_wkt))
+    layer.CreateFeature(feature)
+
+    # Rasterize reprojects the layer into the raster's SRS; inverse burns everything outside it
+    nodata = dst_ds.GetRasterBand(1).GetNoDataValue()
+    gdal.Rasterize(dst_ds, mem_ds, bands=[1], burnValues=[nodata], inverse=True, allTouched=True)
+
+
 if __name__ == '__main__':
     convert_hdf_to_geotiff('https://spmfieldyieldestimation.blob.core.windows.net/fapar/MCD15A2H.A2024361.h25v06.061.2025004042727.hdf')
@@ -1,69 +1,143 @@
-import sys
 import tempfile
 import zipfile
 import logging
+import threading
+from collections import OrderedDict
 
+from typing import Callable
 from pathlib import Path
-from utils import validate_date_format
+from utils import validate_date_format, TTLCache
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-
-def download_fapar_data(start_date: str, end_date: str, shape_file: str) -> str:
-    import geopandas as gpd
+DEFAULT_SEARCH_TTL_SECONDS = 3600
+
+# Per-worker Earthdata session and CMR search results, shared across activity runs.
+_auth = None
+_auth_lock = threading.Lock()
+_search_cache = TTLCache(DEFAULT_SEARCH_TTL_SECONDS)
+
+# AOIs memoized by shapefile identity; AOIs are reused across many runs.
+AOI_CACHE_SIZE = 256
+_aoi_cache: OrderedDict = OrderedDict()
+_aoi_lock = threading.Lock()
+
+
+def download_fapar_data(
+        start_date: str,
+        end_date: str,
+        bbox: tuple[float, float, float, float],
+        download_threads=8,
+        is_cached: Callable[[str], bool] | None = None,
+        search_ttl_seconds=DEFAULT_SEARCH_TTL_SECONDS,
+        work_dir: str | None = None,
+) -> tuple[list[str], list[str]]:
+    """
+    Find every FAPAR granule intersecting `bbox` (EPSG:4326, see `load_aoi`) in the
+    date range and download the ones `is_cached` does not already know by file name.
+
+    Returns the file names of all matching granules, and the local paths of
+    the granules downloaded by this call.
+    """
     import earthaccess
 
     try:
-        # Authenticate with NASA Earthdata
-        earthaccess.login()
-
-        # Create temporary directory
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Extract shapefile
-            shapefile_path = extract_shapefile(shape_file, temp_dir)
+        # Authenticate with NASA Earthdata once per worker
+        login()
 
-            # Read shapefile
-            shape_file = gpd.read_file(shapefile_path)
+        # Granules must outlive this call so the activity can upload them
+        download_dir = tempfile.mkdtemp(prefix="fapar_granules_", dir=work_dir)
 
-            # Get bounding box
-            bbox = get_bounding_box(shape_file)
+        # Find data
+        granules = find_fapar_data(start_date, end_date, bbox, search_ttl_seconds)
 
-            # Find data
-            granules = find_fapar_data(start_date, end_date, bbox)
+        if not granules:
+            logger.error("No data granules found for the specified criteria")
+            raise ValueError("No data granules found for the specified criteria")
 
-            if not granules:
-                logger.error("No data granules found for the specified criteria")
-                raise ValueError("No data granules found for the specified criteria")
+        names = [granule_file_name(granule) for granule in granules]
+        missing = [granule for granule, name in zip(granules, names)
+                   if is_cached is None or not is_cached(name)]
+        logger.info(f"{len(granules) - len(missing)} of {len(granules)} granules already cached")
 
-            # Download and process data
-            output_files = earthaccess.download(granules, temp_dir)
-            logger.info(f"Downloaded to {temp_dir}")
+        # Download the missing granules concurrently
+        output_files = []
+        if missing:
+            output_files = earthaccess.download(missing, download_dir, threads=download_threads)
+            logger.info(f"Downloaded {len(output_files)} granules to {download_dir}")
 
-            return output_files[0]
+        return names, [str(f) for f in output_files]
 
     except Exception as e:
         logger.error(f"Error: {e}")
         raise e
 
 
-def extract_shapefile(zip_path: str, temp_dir: str) -> str:
-    """Extract shapefile from zip archive to a temporary directory."""
-    try:
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(temp_dir)
+def cached_aoi(cache_key, fetch_shapefile_zip: Callable[[], str]) -> dict:
+    """
+    Return the AOI for a shapefile zip, memoized under `cache_key` (e.g. blob
+    name + ETag). `fetch_shapefile_zip` is only called on a miss.
+    """
+    with _aoi_lock:
+        aoi = _aoi_cache.get(cache_key)
+        if aoi is not None:
+            _aoi_cache.move_to_end(cache_key)
+            return aoi
 
-        # Find the .shp file in the extracted content
-        shp_files = list(Path(temp_dir).glob('**/*.shp'))
-        if not shp_files:
-            logger.error("No shapefile found in the zip archive.")
-            sys.exit(1)
+    aoi = load_aoi(fetch_shapefile_zip())
 
-        return str(shp_files[0])
-    except Exception as e:
-        logger.error(f"Error extracting shapefile: {e}")
-        raise e
+    with _aoi_lock:
+        _aoi_cache[cache_key] = aoi
+        while len(_aoi_cache) > AOI_CACHE_SIZE:
+            _aoi_cache.popitem(last=False)
+    return aoi
+
+
+def load_aoi(zip_path: str) -> dict:
+    """
+    Read a zipped shapefile in place and return its AOI in EPSG:4326:
+    {"bbox": (minx, miny, maxx, maxy), "geometry": <shapely geometry>}.
+    """
+    import geopandas as gpd
+
+    gdf = gpd.read_file(shapefile_vsi_path(zip_path))
+
+    # Reproject once; both the bbox and the geometry come from the WGS84 frame
+    if gdf.crs != 'EPSG:4326':
+        gdf = gdf.to_crs('EPSG:4326')
+
+    return {"bbox": get_bounding_box(gdf), "geometry": gdf.geometry.union_all()}
+
+
+def login():
+    """Authenticate with NASA Earthdata, reusing the session for the life of the worker."""
+    import earthaccess
+
+    global _auth
+    with _auth_lock:
+        if _auth is None or not _auth.authenticated:
+            _auth = earthaccess.login()
+        return _auth
+
+
+def granule_file_name(granule) -> str:
+    """File name of a granule's HDF, e.g. MCD15A2H.A2024361.h25v06.061.2025004042727.hdf."""
+    return Path(granule.data_links()[0]).name
+
+
+def shapefile_vsi_path(zip_path: str) -> str:
+    """GDAL path of the first .shp inside a zip archive, readable without extracting it."""
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        shp_files = sorted(name for name in zip_ref.namelist() if name.lower().endswith('.shp'))
+
+    if not shp_files:
+        error_msg = f"No shapefile found in the zip archive {zip_path}"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    return f"/vsizip/{zip_path}/{shp_files[0]}"
 
 
 def get_bounding_box(gdf):
@@ -73,16 +147,14 @@ def get_bounding_box(gdf):
         gdf = gdf.to_crs('EPSG:4326')
 
     # Get the total bounds of the GeoDataFrame
-    minx, miny, maxx, maxy = gdf.total_bounds
+    minx, miny, maxx, maxy = (float(v) for v in gdf.total_bounds)
     logger.info(f"Bounding box: {minx}, {miny}, {maxx}, {maxy}")
 
     return minx, miny, maxx, maxy
 
 
-def find_fapar_data(start_date: str, end_date: str, bbox):
-    import earthaccess
-
-    """Find FAPAR data for the given bounding box and date range."""
+def find_fapar_data(start_date: str, end_date: str, bbox, cache_ttl_seconds=DEFAULT_SEARCH_TTL_SECONDS):
+    """Find FAPAR data for the given bounding box and date range, reusing recent identical searches."""
     # Validate date formats as required by the API
     validate_date_format(start_date, '%Y-%m-%d')
     validate_date_format(end_date, '%Y-%m-%d')
@@ -90,6 +162,23 @@ def find_fapar_data(start_date: str, end_date: str, bbox):
     # Define spatial bounds
     minx, miny, maxx, maxy = bbox
 
+    cache_key = ("MCD15A2H", tuple(round(float(v), 6) for v in bbox), start_date, end_date)
+    results = _search_cache.get(cache_key, cache_ttl_seconds)
+    if results is not None:
+        logger.info(f"Using cached search results: {len(results)} data granules.")
+        return results
+
+    results = _search_fapar_data(start_date, end_date, (minx, miny, maxx, maxy))
+    if results:
+        _search_cache.set(cache_key, results)
+    return results
+
+
+def _search_fapar_data(start_date: str, end_date: str, bbox):
+    import earthaccess
+
+    minx, miny, maxx, maxy = bbox
+
     # Search parameters
     logger.info(f"Searching for FAPAR data between {start_date} and {end_date}")
 
@@ -132,4 +221,4 @@ if __name__ == '__main__':
     download_fapar_data(
         '2025-01-01',
         '2025-01-08',
-        'https://spmfieldyieldestimation.blob.core.windows.net/fapar/East-Nimar-Khandwa.zip')
+        load_aoi('East-Nimar-Khandwa.zip')["bbox"])
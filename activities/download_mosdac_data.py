@@ -1,68 +1,155 @@
 import os
+import time
+import queue
 import tempfile
 import logging
+import threading
 
 from typing import List
 from pathlib import Path
+from contextlib import contextmanager
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+SFTP_HOST = "download.mosdac.gov.in"
+SFTP_PORT = 22
 
-def download_mosdac_data(remote_path: str) -> list[Path]:
+# Outstanding read requests per transfer. paramiko's default (unbounded) can
+# overwhelm the server; this keeps the pipe full without tripping its limits.
+MAX_PREFETCH_REQUESTS = 64
+
+
+def download_mosdac_data(
+        remote_path: str,
+        max_sessions: int = 4,
+        known_files: dict[str, dict] | None = None,
+        work_dir: str | None = None,
+) -> tuple[list[Path], list[dict]]:
     """
-    Recursively download every *.tif file found under `remote_path` on
-    MOSDAC's SFTP server into a *single* temporary directory.
+    Download every *.tif file found under `remote_path` on MOSDAC's SFTP
+    server into a *single* temporary directory.
+
+    The directory is listed once; files are then fetched concurrently over
+    up to `max_sessions` independent SFTP sessions with read prefetching.
 
-    Returns a list of Path objects pointing to the local copies.
+    `known_files` maps file names to manifest records from a previous run
+    (see `manifest_record`). Files whose size and mtime still match are not
+    downloaded again.
+
+    Returns the local paths of the files actually downloaded, and a manifest
+    record for every *.tif in the listing, in listing order.
     """
+    known_files = known_files or {}
+
+    # One temp directory that will contain all TIFFs flat.
+    local_root = Path(tempfile.mkdtemp(prefix="mosdac_flat_", dir=work_dir))
+
+    with _open_sftp() as sftp:
+        logger.info("✅ Connected to SFTP server")
+        listing = _list_tifs(sftp, remote_path)
+        records = [manifest_record(remote_path, entry) for entry in listing]
+
+        entries = [entry for entry, record in zip(listing, records)
+                   if not is_unchanged(record, known_files.get(entry.filename))]
+        logger.info(f"{len(listing) - len(entries)} of {len(listing)} files unchanged since last sync")
+
+        pending: queue.Queue = queue.Queue()
+        for entry in entries:
+            pending.put(entry)
+
+        # The listing session downloads too; open extra sessions only if there is work for them.
+        extra_sessions = max(0, min(max_sessions, len(entries)) - 1)
+        errors: list[Exception] = []
+        workers = [threading.Thread(target=_session_worker, args=(remote_path, local_root, pending, errors))
+                   for _ in range(extra_sessions)]
+        for worker in workers:
+            worker.start()
+
+        _drain(sftp, remote_path, local_root, pending, errors)
+
+        for worker in workers:
+            worker.join()
+
+    if errors:
+        raise errors[0]
+
+    downloaded = [local_root.joinpath(entry.filename) for entry in entries]
+    logger.info(f"📥  Downloaded {len(downloaded)} files into {local_root} using {extra_sessions + 1} sessions")
+    return downloaded, records
+
 
+def manifest_record(remote_path: str, entry) -> dict:
+    """Describe a remote file for the sync manifest. `blob` is filled in once it is stored."""
+    return {
+        "name": entry.filename,
+        "remote_path": f"{remote_path}/{entry.filename}",
+        "size": entry.st_size,
+        "mtime": entry.st_mtime,
+        "blob": None,
+    }
+
+
+def is_unchanged(record: dict, previous: dict | None) -> bool:
+    return (previous is not None
+            and previous.get("blob") is not None
+            and previous.get("size") == record["size"]
+            and previous.get("mtime") == record["mtime"])
+
+
+@contextmanager
+def _open_sftp():
     import paramiko
 
-    sftp_host = "download.mosdac.gov.in"
-    sftp_port = 22
     sftp_username = os.environ["MOSDAC_USER_NAME"]
     sftp_password = os.environ["MOSDAC_PASSWORD"]
 
-    # One temp directory that will contain all TIFFs flat.
-    local_root = Path(tempfile.mkdtemp(prefix="mosdac_flat_"))
-
-    transport = paramiko.Transport((sftp_host, sftp_port))
+    transport = paramiko.Transport((SFTP_HOST, SFTP_PORT))
     try:
         transport.connect(username=sftp_username, password=sftp_password)
         with paramiko.SFTPClient.from_transport(transport) as sftp:
-            logger.info("✅ Connected to SFTP server")
-            downloaded = _collect_tifs_flat(sftp, remote_path, local_root)
-            logger.info(f"📥  Downloaded {len(downloaded)} files into {local_root}")
-            return downloaded
+            yield sftp
     finally:
         transport.close()
 
 
-def _collect_tifs_flat(
-        sftp,
-        remote_path: str,
-        local_root: Path,
-) -> list[Path]:
-    """
-    Walk `remote_dir`; for each *.tif file, download it into `local_root`.
+def _list_tifs(sftp, remote_path: str) -> list:
+    logger.info(f"Listing {remote_path}")
+    return [entry for entry in sftp.listdir_attr(remote_path) if entry.filename.lower().endswith(".tif")]
 
-    `name_counts` keeps track of how many times we've already used a given
-    base filename so we can disambiguate clashes.
-    """
-    result: list[Path] = []
 
-    logger.info(f"Listing {remote_path}")
-    for entry in sftp.listdir_attr(remote_path):
-        remote_file = f"{remote_path}/{entry.filename}"
+def _session_worker(remote_path: str, local_root: Path, pending: queue.Queue, errors: List[Exception]):
+    # _drain records its own transfer failures; anything raised here means this
+    # session could not be opened (e.g. server session limit), so the remaining
+    # sessions simply pick up its share of the queue.
+    try:
+        with _open_sftp() as sftp:
+            _drain(sftp, remote_path, local_root, pending, errors)
+    except Exception as e:
+        logger.warning(f"Extra SFTP session unavailable: {e}")
 
-        if not entry.filename.lower().endswith(".tif"):
-            continue  # skip non-TIFFs
 
-        local_file = local_root.joinpath(entry.filename)
-        sftp.get(remote_file, str(local_file))
+def _drain(sftp, remote_path: str, local_root: Path, pending: queue.Queue, errors: List[Exception]):
+    """Download queued entries over `sftp` until the queue is empty or another session failed."""
+    while not errors:
+        try:
+            entry = pending.get_nowait()
+        except queue.Empty:
+            return
 
-        result.append(local_file)
+        remote_file = f"{remote_path}/{entry.filename}"
+        local_file = local_root.joinpath(entry.filename)
 
-    return result
+        start = time.monotonic()
+        try:
+            sftp.get(remote_file, str(local_file), prefetch=True,
+                     max_concurrent_prefetch_requests=MAX_PREFETCH_REQUESTS)
+        except Exception as e:
+            logger.error(f"Failed to download {remote_file}: {e}")
+            errors.append(e)
+            return
+
+        elapsed = max(time.monotonic() - start, 1e-6)
+        size_mb = (entry.st_size or 0) / (1024 * 1024)
+        logger.info(f"Downloaded {entry.filename}: {size_mb:.1f} MB in {elapsed:.1f}s ({size_mb / elapsed:.1f} MB/s)")
@@ -0,0 +1,152 @@
+import logging
+from pathlib import Path
+from datetime import datetime
+from typing import Callable
+
+import telemetry
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+VARIABLE_NAME = "fapar"
+
+# Chunks are tall in time and small in space: one chunk holds about a year of
+# 8-day composites for a 128 x 128 pixel tile, so a per-pixel time series is a
+# single chunk read instead of one read per date.
+DEFAULT_TIME_CHUNK = 46
+DEFAULT_SPATIAL_CHUNK = 128
+
+# Cubes are always written in the Zarr v2 layout (zarr-python 3 defaults to v3): an
+# append reads the consolidated metadata first to decide which objects it needs
+# (see `append_working_set`).
+ZARR_FORMAT = 2
+ZMETADATA = ".zmetadata"
+
+
+def modis_date(date: str) -> datetime:
+    """Parse a MODIS acquisition date such as 'A2024361' (year + day of year)."""
+    return datetime.strptime(date.lstrip("A"), "%Y%j")
+
+
+def append_working_set(zmetadata: dict) -> Callable[[str], bool]:
+    """
+    Predicate over store-relative object paths selecting what an append reads or
+    rewrites, given the cube's consolidated metadata (`.zmetadata`): all metadata
+    and coordinates, plus the chunks of the trailing, partially filled time chunk.
+    Older chunks are never touched, so they can stay remote.
+    """
+    array = zmetadata["metadata"][f"{VARIABLE_NAME}/.zarray"]
+    trailing_chunk = array["shape"][0] // array["chunks"][0]
+    separator = array.get("dimension_separator") or "."
+
+    def needed(relative_path: str) -> bool:
+        variable, _, key = relative_path.partition("/")
+        if variable != VARIABLE_NAME or key.startswith(".z"):
+            return True
+        return int(key.split(separator)[0]) >= trailing_chunk
+
+    return needed
+
+
+def append_to_datacube(store_path: str,
+                       input_tiffs: list[str],
+                       dates: list[str],
+                       time_chunk=DEFAULT_TIME_CHUNK,
+                       spatial_chunk=DEFAULT_SPATIAL_CHUNK) -> list[str]:
+    """
+    Append one raster per date to the (time, y, x) Zarr cube at `store_path`, creating it if needed.
+    An existing store only needs the objects selected by `append_working_set`.
+
+    The first raster written fixes the cube's grid; later rasters are warped onto
+    it so dates with different tile coverage still line up. Dates already in the
+    cube are skipped, which makes re-running a range (or retrying) a no-op.
+    All new dates are written in one append so each partially filled time chunk
+    is rewritten once per call. Returns the dates that were appended.
+    """
+    import numpy as np
+    import xarray as xr
+
+    store = Path(store_path)
+    existing = None
+    if store.exists():
+        if not store.joinpath(ZMETADATA).exists():
+            error_msg = f"Datacube {store} has no {ZMETADATA}; refusing to overwrite it as a new cube"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        existing = xr.open_zarr(store, consolidated=True, zarr_format=ZARR_FORMAT)
+
+    existing_times = set(existing["time"].values.astype("datetime64[D]")) if existing is not None else set()
+    new_items = sorted(
+        (modis_date(date), date, tiff) for date, tiff in zip(dates, input_tiffs)
+        if np.datetime64(modis_date(date), "D") not in existing_times
+    )
+    if not new_items:
+        logger.info(f"Datacube {store} already holds all {len(dates)} dates")
+        return []
+
+    if existing is not None and np.datetime64(new_items[0][0], "ns") < existing["time"].values.max():
+        logger.warning(f"Appending dates older than the newest in {store}; the time axis will not be sorted")
+
+    if existing is not None:
+        crs_wkt = existing.attrs["crs_wkt"]
+        geo_transform = tuple(existing.attrs["geo_transform"])
+        width, height = existing.sizes["x"], existing.sizes["y"]
+    else:
+        crs_wkt, geo_transform, width, height = _raster_grid(new_items[0][2])
+
+    layers = np.empty((len(new_items), height, width), dtype=np.float32)
+    for idx, (_, _, tiff) in enumerate(new_items):
+        _read_onto_grid(tiff, crs_wkt, geo_transform, width, height, layers[idx])
+        telemetry.observe_raster(width, height)
+
+    xs = geo_transform[0] + (np.arange(width) + 0.5) * geo_transform[1]
+    ys = geo_transform[3] + (np.arange(height) + 0.5) * geo_transform[5]
+    dataset = xr.Dataset(
+        {VARIABLE_NAME: (("time", "y", "x"), layers)},
+        coords={"time": [np.datetime64(t, "ns") for t, _, _ in new_items], "y": ys, "x": xs},
+        attrs={"crs_wkt": crs_wkt, "geo_transform": list(geo_transform)},
+    )
+
+    if existing is None:
+        encoding = {VARIABLE_NAME: {"chunks": (time_chunk, spatial_chunk, spatial_chunk)}}
+        dataset.to_zarr(store, mode="w", encoding=encoding, consolidated=True, zarr_format=ZARR_FORMAT)
+    else:
+        existing.close()
+        dataset.to_zarr(store, append_dim="time", consolidated=True, zarr_format=ZARR_FORMAT)
+
+    appended = [date for _, date, _ in new_items]
+    logger.info(f"🧊 Appended {len(appended)} dates to datacube {store}")
+    return appended
+
+
+def _raster_grid(tiff: str) -> tuple[str, tuple, int, int]:
+    from osgeo import gdal
+
+    ds = gdal.Open(tiff, gdal.GA_ReadOnly)
+    if ds is None:
+        error_msg = f"Could not open input file: {tiff}"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    return ds.GetProjection(), ds.GetGeoTransform(), ds.RasterXSize, ds.RasterYSize
+
+
+def _read_onto_grid(tiff: str, crs_wkt: str, geo_transform: tuple, width: int, height: int, out):
+    """Read band 1 of `tiff` resampled onto the cube grid into `out`, with nodata as NaN."""
+    from osgeo import gdal
+
+    src_ds = gdal.Open(tiff, gdal.GA_ReadOnly)
+    if src_ds is None:
+        error_msg = f"Could not open input file: {tiff}"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    min_x = geo_transform[0]
+    max_y = geo_transform[3]
+    max_x = min_x + width * geo_transform[1]
+    min_y = max_y + height * geo_transform[5]
+    warped = gdal.Warp("", src_ds, format="MEM", dstSRS=crs_wkt, outputBounds=(min_x, min_y, max_x, max_y),
+                       width=width, height=height, resampleAlg="near", outputType=gdal.GDT_Float32,
+                       dstNodata=float("nan"))
+    warped.GetRasterBand(1).ReadAsArray(buf_obj=out)
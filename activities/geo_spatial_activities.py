@@ -1,14 +1,32 @@
+import os
+import io
+import json
+import asyncio
+import hashlib
 import logging
+import functools
+import contextvars
+import multiprocessing
 from pathlib import Path
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
+import telemetry
+import gdal_profiles
 from temporalio import activity
-from azure_storage import AzureStorage
+from azure_storage import AzureStorage, CONTENT_KEY_METADATA, DEFAULT_LEASE_SECONDS
+from workspace import WorkspaceManager
+from derived_artifacts import DEFAULT_DERIVED_PREFIX, derived_key, derived_blob, source_key
 
 from activities.download_mosdac_data import download_mosdac_data
 from activities.scale_tiff import scale_tiff
 from activities.compose_tiff import compose_tiff
-from activities.download_fapar_data import download_fapar_data
-from activities.convert_hdf_to_geotiff import convert_hdf_to_geotiff
+from activities.scale_and_compose_tiff import scale_and_compose_tiff
+from activities.download_fapar_data import download_fapar_data, cached_aoi
+from activities.convert_hdf_to_geotiff import convert_hdf_to_geotiff, DEFAULT_CHUNK_ROWS
+from activities.zonal_stats import zonal_stats
+from activities.overviews import to_cloud_optimized, DEFAULT_OVERVIEW_RESAMPLING, DEFAULT_OVERVIEW_LEVELS
+from activities.fapar_datacube import append_to_datacube, append_working_set, ZMETADATA, DEFAULT_TIME_CHUNK, DEFAULT_SPATIAL_CHUNK
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -20,70 +38,482 @@ class GeoSpatialActivities:
         self._config = config
         self._azure_storage = azure_storage
 
+        # Blob transfers, SFTP and Earthdata calls block on the network and run on threads.
+        # GDAL/pyhdf work only partly releases the GIL, so raster transforms run in
+        # separate processes. Spawned (not forked) so children don't inherit the
+        # Temporal runtime's threads.
+        io_pool_size = int(config.get("io_thread_pool_size", 16))
+        self._raster_pool_size = int(config.get("raster_process_pool_size", 0)) or os.cpu_count()
+        self._io_executor = ThreadPoolExecutor(max_workers=io_pool_size, thread_name_prefix="geo_io")
+        self._raster_executor = self._new_raster_executor()
+
+        # Read raster inputs in place through GDAL's /vsiaz/ filesystem instead of downloading them.
+        self._remote_reads = config.get("raster_remote_reads", "false").lower() == "true"
+
+        # Optional COG overview pyramids on MOSDAC and HDF outputs (mosaics always get them);
+        # scale_tiff copies a level out instead of warping when the factor and resampling match.
+        self._write_overviews = config.get("write_overviews", "false").lower() == "true"
+        self._overview_resampling = config.get("overview_resampling", DEFAULT_OVERVIEW_RESAMPLING)
+        self._overview_levels = int(config.get("overview_levels", DEFAULT_OVERVIEW_LEVELS))
+
+        # Every activity gets a scratch workspace that is removed when it finishes.
+        self._workspaces = WorkspaceManager(
+            config.get("scratch_root", "/tmp/geospatial_scratch"),
+            int(float(config.get("scratch_quota_gb", 50)) * 1024 ** 3))
+
+    async def _run_io(self, fn, *args, **kwargs):
+        # Copy the context so telemetry counters recorded on the thread reach this activity.
+        ctx = contextvars.copy_context()
+        return await _run_in(self._io_executor, ctx.run, telemetry.run_timed, functools.partial(fn, **kwargs), *args)
+
+    def _new_raster_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self._raster_pool_size, mp_context=multiprocessing.get_context("spawn"))
+
+    async def _run_raster(self, fn, *args, **kwargs):
+        executor = self._raster_executor
+        try:
+            result, measured = await _run_in(
+                executor, telemetry.run_measured, functools.partial(fn, **kwargs), *args)
+        except BrokenProcessPool:
+            # A child died (OOM kill, GDAL segfault) and the pool refuses all further work.
+            # Replace it once, however many activities saw it break, and let Temporal
+            # retry this activity on the fresh pool.
+            if self._raster_executor is executor:
+                logger.error("Raster process pool broke; starting a new one")
+                self._raster_executor = self._new_raster_executor()
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        telemetry.merge_measured(measured)
+        return result
+
+    async def _run_raster_on_blobs(self, fn, blob_names: str | list[str], work_dir: str, *args, **kwargs):
+        """
+        Run raster `fn(inputs, *args, **kwargs)` on one blob or a list of blobs.
+
+        With `raster_remote_reads` GDAL opens the blobs in place and fetches only the
+        byte ranges it needs (downsampling and AOI windows touch a fraction of the
+        blocks). The blobs are probed first; only if they cannot be reached that way
+        (no token, HTTP or VSI errors on open) are they downloaded in full instead.
+        Errors from `fn` itself are raised as they are, never retried locally.
+        """
+        names = [blob_names] if isinstance(blob_names, str) else blob_names
+
+        def as_inputs(paths):
+            return paths[0] if isinstance(blob_names, str) else paths
+
+        if self._remote_reads:
+            remote_paths = [self._azure_storage.vsi_path(name) for name in names]
+            try:
+                options = await self._run_io(self._azure_storage.gdal_config)
+                failed = await self._run_io(gdal_profiles.with_gdal_config, options,
+                                            gdal_profiles.unopenable, remote_paths)
+            except RuntimeError as e:
+                failed = [str(e)]
+
+            if not failed:
+                return await self._run_raster(
+                    functools.partial(gdal_profiles.with_gdal_config, options, fn),
+                    as_inputs(remote_paths), *args, **kwargs)
+            logger.warning(f"Cannot open {', '.join(failed)} remotely; falling back to full download")
+
+        local_paths = await self._run_io(self._azure_storage.download_files, names, work_dir)
+        return await self._run_raster(fn, as_inputs(local_paths), *args, **kwargs)
+
+    async def _memoized(self, activity_name: str, fn, input_blobs: list[str], params: dict,
+                        output_name: str, compute) -> str | None:
+        """
+        Put `output_name` into the workflow folder, computing it only when needed.
+
+        The output is keyed by the content identity of the inputs, the output-affecting
+        parameters and the transform's code version. Workflow-folder blobs are fresh
+        uploads or copies with new ETags in every run, so inputs are identified by the
+        content key their producer recorded (source file version, granule, or the
+        derived key of an upstream step) and only fall back to the ETag without one.
+        The output is stored with its own key as content key, chaining the keys.
+
+        A hit in the derived-artifact store (also after a retry of an activity whose
+        completion was lost) is a server-side copy; a miss runs `compute(workspace)`,
+        which returns the local output file, and stores the result for the next run.
+        When `compute` returns None there is no output: nothing is stored and None is
+        returned. An empty `derived_prefix` disables this.
+        """
+        workflow_blob = f"{activity.info().workflow_id}/{output_name}"
+        prefix = self._config.get("derived_prefix", DEFAULT_DERIVED_PREFIX)
+
+        store_blob = None
+        if prefix:
+            identities = await asyncio.gather(*[
+                self._run_io(self._azure_storage.content_identity, b) for b in input_blobs])
+            # Creation options change the bytes written, thread counts do not.
+            params = {**params,
+                      "creation_options": [option for option in gdal_profiles.gtiff_creation_options()
+                                           if not option.startswith("NUM_THREADS=")],
+                      "overviews": [self._write_overviews, self._overview_resampling, self._overview_levels]}
+            key = await self._run_io(derived_key, fn, list(identities), params)
+            store_blob = derived_blob(prefix, activity_name, key, output_name)
+            metadata = {CONTENT_KEY_METADATA: key}
+
+            if await self._run_io(self._azure_storage.exists, store_blob):
+                logger.info(f"♻️ Reusing derived artifact {store_blob}")
+                await self._run_io(self._azure_storage.copy_blob, store_blob, workflow_blob, metadata)
+                return output_name
+
+        with self._workspaces.open(activity_name) as workspace:
+            output_file = await compute(workspace)
+            if output_file is None:
+                return None
+            workspace.check_quota()
+            if store_blob:
+                await self._run_io(self._azure_storage.upload_file, store_blob, output_file, metadata)
+            else:
+                await self._run_io(self._azure_storage.upload_file, workflow_blob, output_file)
+
+        if store_blob:
+            await self._run_io(self._azure_storage.copy_blob, store_blob, workflow_blob, metadata)
+        return output_name
+
+    def _compose_cache_mb(self) -> int | None:
+        # Optional per-mosaic override; otherwise the GDAL profile's gdal_cachemax applies.
+        value = self._config.get("compose_cache_mb")
+        return int(value) if value else None
+
+    async def warm_up(self, io=True, raster=True):
+        """
+        Pay library import and process spawn costs before the worker starts polling,
+        instead of on the first activities it picks up.
+        """
+        if io:
+            await _run_in(self._io_executor, _import_io_libraries)
+        if raster:
+            # Concurrent submissions make the pool spawn every worker process up front.
+            timings = await asyncio.gather(*[_run_in(self._raster_executor, gdal_profiles.warm_up)
+                                             for _ in range(self._raster_pool_size)])
+            logger.info(f"🔥 {len(timings)} raster worker processes ready (slowest {max(timings):.2f}s)")
+
+    def shutdown(self):
+        self._io_executor.shutdown(wait=False, cancel_futures=True)
+        self._raster_executor.shutdown(wait=False, cancel_futures=True)
+        self._azure_storage.close()
+
     @activity.defn(name="download_mosdac_data")
-    async def download_mosdac_data(self, remote_path: str) -> list[str]:
+    async def download_mosdac_data(self, remote_path: str, incremental=True) -> list[str]:
         info = activity.info()
         workflow_id = info.workflow_id
 
-        files = download_mosdac_data(remote_path)
-        for file in files:
-            self._azure_storage.upload_bytes(f"{workflow_id}/{file.name}", read_file_to_bytes(file))
+        # The manifest remembers which blob holds each remote file as of the last sync,
+        # so unchanged files are copied server-side instead of re-fetched over SFTP.
+        manifest_blob = mosdac_manifest_blob(remote_path)
+        known_files = {}
+        if incremental:
+            known_files = await self._run_io(self._load_mosdac_manifest, manifest_blob)
+
+        with self._workspaces.open("download_mosdac_data") as workspace:
+            files, records = await self._run_io(
+                download_mosdac_data, remote_path, int(self._config.get("mosdac_sftp_sessions", 4)), known_files,
+                work_dir=str(workspace.path))
+            workspace.check_quota()
+            downloaded = {file.name: file for file in files}
+            telemetry.add("sftp_bytes", sum(r["size"] or 0 for r in records if r["name"] in downloaded))
+
+            uploads, copies = [], []
+            for record in records:
+                blob_name = f"{workflow_id}/{record['name']}"
+                # Same remote file version, same content key: downstream memoization hits across runs.
+                metadata = {CONTENT_KEY_METADATA: source_key(
+                    "mosdac", remote_path=record["remote_path"], size=record["size"], mtime=record["mtime"])}
+                if record["name"] in downloaded:
+                    uploads.append((blob_name, downloaded[record["name"]], metadata))
+                else:
+                    copies.append((known_files[record["name"]]["blob"], blob_name, metadata))
+                record["blob"] = blob_name
+
+            await self._run_io(self._azure_storage.upload_files, uploads)
+            await self._run_io(self._azure_storage.copy_blobs, copies)
+
+        manifest = json.dumps({record["name"]: record for record in records}).encode()
+        await self._run_io(self._azure_storage.upload_bytes, manifest_blob, manifest)
+
+        return [record["name"] for record in records]
+
+    def _load_mosdac_manifest(self, manifest_blob: str) -> dict[str, dict]:
+        if not self._azure_storage.exists(manifest_blob):
+            return {}
+
+        buffer = io.BytesIO()
+        self._azure_storage.download_to_stream(manifest_blob, buffer)
+        manifest = json.loads(buffer.getvalue())
+
+        # Only trust entries whose blob is still around (older workflow outputs may be purged).
+        return {name: record for name, record in manifest.items()
+                if record.get("blob") and self._azure_storage.exists(record["blob"])}
+
+    @activity.defn(name="cloud_optimize_tiff")
+    async def cloud_optimize_tiff(self, tif_file_name: str) -> str:
+        """
+        Write a COG copy with internal overviews of a downloaded TIFF as `cog_<name>`
+        and return its name (the input name unless `write_overviews` is set). Runs on
+        the raster queue so the rewrite stays off the I/O workers; memoized, so
+        unchanged source files are not redone. The input blob is never modified, so a
+        retry keys on the same source identity and the download manifest stays valid.
+        """
+        if not self._write_overviews:
+            return tif_file_name
+
+        info = activity.info()
+        tif_blob = f"{info.workflow_id}/{tif_file_name}"
+
+        async def compute(workspace):
+            work_dir = str(workspace.path)
+            tif_file = await self._run_io(self._azure_storage.download_file, tif_blob, work_dir)
+            return await self._run_raster(
+                to_cloud_optimized, tif_file, self._overview_resampling, self._overview_levels)
 
-        return [x.name for x in files]
+        return await self._memoized(
+            "cloud_optimize_tiff", to_cloud_optimized, [tif_blob], {}, f"cog_{Path(tif_file_name).name}", compute)
 
     @activity.defn(name="scale_tiff")
-    async def scale_tif(self, tif_file_name: str, scale_factor=0.5) -> str:
+    async def scale_tif(self, tif_file_name: str, scale_factor=0.5, resampling="bilinear",
+                        num_threads=None, warp_memory_mb=512) -> str:
         info = activity.info()
-        workflow_id = info.workflow_id
+        tif_blob = f"{info.workflow_id}/{tif_file_name}"
 
-        tif_file = self._azure_storage.download_file(f"{workflow_id}/{tif_file_name}")
-        scaled_tif_file = scale_tiff(tif_file, scale_factor)
-        self._azure_storage.upload_bytes(f"{workflow_id}/{scaled_tif_file.name}", read_file_to_bytes(scaled_tif_file))
+        async def compute(workspace):
+            work_dir = str(workspace.path)
+            return await self._run_raster_on_blobs(
+                scale_tiff, tif_blob, work_dir,
+                scale_factor, resampling, num_threads, warp_memory_mb, work_dir=work_dir)
 
-        return scaled_tif_file.name
+        return await self._memoized(
+            "scale_tiff", scale_tiff, [tif_blob], {"scale_factor": scale_factor, "resampling": resampling},
+            f"scaled_{Path(tif_file_name).name}", compute)
 
     @activity.defn(name="compose_tiffs")
-    async def compose_tifs(self, tif_files: list[str]) -> str:
+    async def compose_tifs(self, tif_files: list[str], output_name="composed_output.tif") -> str:
+        info = activity.info()
+        # Input order is part of the key: later inputs win where the mosaic overlaps.
+        tif_blobs = [f"{info.workflow_id}/{tif_file}" for tif_file in tif_files]
+
+        async def compute(workspace):
+            work_dir = str(workspace.path)
+            return await self._run_raster_on_blobs(
+                compose_tiff, tif_blobs, work_dir,
+                output_name, self._compose_cache_mb(),
+                overview_resampling=self._overview_resampling, overview_levels=self._overview_levels,
+                work_dir=work_dir)
+
+        return await self._memoized("compose_tiffs", compose_tiff, tif_blobs, {}, output_name, compute)
+
+    @activity.defn(name="scale_and_compose_tiffs")
+    async def scale_and_compose_tifs(self, tif_files: list[str], scale_factor=0.5, resampling="bilinear",
+                                     upload_intermediates=False) -> str:
         info = activity.info()
         workflow_id = info.workflow_id
 
-        input_tiffs = []
-        for tif_file in tif_files:
-            downloaded_file = self._azure_storage.download_file(f"{workflow_id}/{tif_file}")
-            input_tiffs.append(downloaded_file)
+        with self._workspaces.open("scale_and_compose_tiffs") as workspace:
+            work_dir = str(workspace.path)
+            composed_tif, intermediates = await self._run_raster_on_blobs(
+                scale_and_compose_tiff, [f"{workflow_id}/{tif_file}" for tif_file in tif_files], work_dir,
+                scale_factor, resampling, "composed_output.tif",
+                self._compose_cache_mb(), upload_intermediates,
+                overview_resampling=self._overview_resampling, overview_levels=self._overview_levels,
+                work_dir=work_dir)
+            workspace.check_quota()
 
-        composed_tif = compose_tiff(input_tiffs)
-        self._azure_storage.upload_bytes(f"{workflow_id}/{composed_tif.name}", read_file_to_bytes(composed_tif))
+            await self._run_io(self._azure_storage.upload_files,
+                               [(f"{workflow_id}/{path.name}", path) for path in [*intermediates, composed_tif]])
 
         return composed_tif.name
 
     @activity.defn(name="download_fapar_data")
-    async def download_fapar_data(self, start_date: str, end_date: str, shape_file_name: str) -> str:
+    async def download_fapar_data(self, start_date: str, end_date: str, shape_file_name: str) -> list[str]:
         info = activity.info()
         workflow_id = info.workflow_id
 
-        shape_file = self._azure_storage.download_file(shape_file_name)
-        fapar_hdf_path = download_fapar_data(start_date, end_date, shape_file)
+        with self._workspaces.open("download_fapar_data") as workspace:
+            work_dir = str(workspace.path)
+            aoi = await self._run_io(self._load_aoi, shape_file_name, work_dir)
+            granule_names, fapar_hdf_paths = await self._run_io(
+                download_fapar_data, start_date, end_date, aoi["bbox"],
+                int(self._config.get("earthdata_download_threads", 8)),
+                lambda name: self._azure_storage.exists(self._granule_blob(name)),
+                int(self._config.get("cmr_search_ttl_seconds", 3600)),
+                work_dir=work_dir)
+            workspace.check_quota()
+
+            # New granules go to the shared granule cache first (which also keeps a local copy)...
+            fapar_hdfs = [Path(p) for p in fapar_hdf_paths]
+            telemetry.add("earthdata_bytes", sum(fapar_hdf.stat().st_size for fapar_hdf in fapar_hdfs))
+            await asyncio.gather(*[
+                self._run_io(self._azure_storage.upload_file, self._granule_blob(fapar_hdf.name), fapar_hdf,
+                             self._granule_metadata(fapar_hdf.name))
+                for fapar_hdf in fapar_hdfs
+            ])
+
+        # ...and every granule is then copied server-side into this workflow's folder.
+        await asyncio.gather(*[
+            self._run_io(self._azure_storage.copy_blob, self._granule_blob(name), f"{workflow_id}/{name}",
+                         self._granule_metadata(name))
+            for name in granule_names
+        ])
+
+        return granule_names
 
-        fapar_hdf = Path(fapar_hdf_path)
-        self._azure_storage.upload_bytes(f"{workflow_id}/{fapar_hdf.name}", read_file_to_bytes(fapar_hdf))
+    def _load_aoi(self, shape_file_name: str, work_dir: str) -> dict:
+        # Keyed by ETag so a re-uploaded shapefile is re-read; hits skip the download entirely.
+        etag = self._azure_storage.get_etag(shape_file_name)
+        return cached_aoi((shape_file_name, etag),
+                          lambda: self._azure_storage.download_file(shape_file_name, work_dir))
 
-        return fapar_hdf.name
+    @staticmethod
+    def _granule_metadata(granule_name: str) -> dict[str, str]:
+        # Granule names carry the production timestamp, so a name identifies its bytes.
+        return {CONTENT_KEY_METADATA: source_key("granule", name=granule_name)}
+
+    def _granule_blob(self, granule_name: str) -> str:
+        prefix = self._config.get("granule_cache_prefix", "granules/modis")
+        return f"{prefix}/{granule_name}"
 
     @activity.defn(name="convert_hdf_to_geotiff")
-    async def convert_hdf_to_geotiff(self, hdf_file_name, required_dataset="Fpar_500m"):
+    async def convert_hdf_to_geotiff(self, hdf_file_name, required_dataset="Fpar_500m",
+                                     aoi_shape_file_name=None, mask_outside_aoi=False) -> str | None:
+        """
+        Convert a granule to a GeoTIFF named after it, cropped to the AOI when given.
+        Returns None for a granule whose tile does not overlap the AOI.
+        """
+        info = activity.info()
+        hdf_blob = f"{info.workflow_id}/{hdf_file_name}"
+
+        async def compute(workspace):
+            work_dir = str(workspace.path)
+
+            # The AOI comes from the (memoized) shapefile so only its pixels are converted
+            aoi_bbox, aoi_geometry_wkt = None, None
+            if aoi_shape_file_name:
+                aoi = await self._run_io(self._load_aoi, aoi_shape_file_name, work_dir)
+                aoi_bbox = aoi["bbox"]
+                if mask_outside_aoi:
+                    aoi_geometry_wkt = aoi["geometry"].wkt
+
+            hdf_file = await self._run_io(self._azure_storage.download_file, hdf_blob, work_dir)
+            return await self._run_raster(
+                convert_hdf_to_geotiff, hdf_file, required_dataset, DEFAULT_CHUNK_ROWS, aoi_bbox, aoi_geometry_wkt,
+                self._overview_resampling if self._write_overviews else None, self._overview_levels,
+                work_dir=work_dir)
+
+        # The shapefile is an input too: a re-uploaded AOI must not reuse an old crop.
+        input_blobs = [hdf_blob, aoi_shape_file_name] if aoi_shape_file_name else [hdf_blob]
+        params = {"required_dataset": required_dataset,
+                  "mask_outside_aoi": bool(aoi_shape_file_name and mask_outside_aoi)}
+        return await self._memoized(
+            "convert_hdf_to_geotiff", convert_hdf_to_geotiff, input_blobs, params,
+            f"{Path(hdf_file_name).stem}.tif", compute)
+
+
+    @activity.defn(name="append_fapar_datacube")
+    async def append_fapar_datacube(self, cube_name: str, tif_files: list[str], dates: list[str]) -> str:
         info = activity.info()
         workflow_id = info.workflow_id
+        cube_prefix = f"{self._config.get('datacube_prefix', 'cubes')}/{cube_name}.zarr"
+
+        # One writer per cube: concurrent appends would each rewrite the trailing chunk and
+        # the consolidated metadata, and the last upload would drop the other run's dates.
+        # A conflicting run fails here and is retried by Temporal once the lease is free.
+        lease = await self._run_io(self._azure_storage.acquire_lease, f"{cube_prefix}.lock")
+        renewal = asyncio.create_task(self._renew_lease(lease))
+        try:
+            with self._workspaces.open("append_fapar_datacube") as workspace:
+                work_dir = str(workspace.path)
+                store_path = workspace.path.joinpath(f"{cube_name}.zarr")
+
+                # Fetch only what the append reads or rewrites, not the cube's full history.
+                zmetadata = await self._run_io(self._load_zmetadata, cube_prefix)
+                if zmetadata is not None:
+                    await self._run_io(self._azure_storage.download_prefix, cube_prefix, store_path,
+                                       append_working_set(zmetadata))
+                before = _file_signatures(store_path)
+                input_tiffs = await self._run_io(
+                    self._azure_storage.download_files, [f"{workflow_id}/{tif_file}" for tif_file in tif_files],
+                    work_dir)
+                workspace.check_quota()
+
+                appended = await self._run_raster(
+                    append_to_datacube, str(store_path), input_tiffs, dates,
+                    int(self._config.get("datacube_time_chunk", DEFAULT_TIME_CHUNK)),
+                    int(self._config.get("datacube_spatial_chunk", DEFAULT_SPATIAL_CHUNK)))
+                workspace.check_quota()
+
+                changed = [path for path, signature in _file_signatures(store_path).items()
+                           if before.get(path) != signature]
+                chunks = [path for path in changed if not path.name.startswith(".z")]
+                metadata = [path for path in changed if path.name.startswith(".z")]
+
+                # Renewing fails if the lease was lost, so nothing is written without it.
+                # Chunks go first so the published metadata never points past uploaded data.
+                await self._run_io(lease.renew)
+                for paths in (chunks, metadata):
+                    await self._run_io(self._azure_storage.upload_files,
+                                       [(f"{cube_prefix}/{path.relative_to(store_path).as_posix()}", path)
+                                        for path in paths])
+                logger.info(f"Datacube {cube_prefix}: {len(appended)} new dates, {len(changed)} objects uploaded")
+        finally:
+            renewal.cancel()
+            await self._run_io(lease.release)
+
+        return cube_prefix
+
+    async def _renew_lease(self, lease, interval=DEFAULT_LEASE_SECONDS / 3):
+        while True:
+            await asyncio.sleep(interval)
+            await self._run_io(lease.renew)
+
+    def _load_zmetadata(self, cube_prefix: str) -> dict | None:
+        zmetadata_blob = f"{cube_prefix}/{ZMETADATA}"
+        if not self._azure_storage.exists(zmetadata_blob):
+            # Without consolidated v2 metadata the append would start a new cube over the old one.
+            if self._azure_storage.list_blobs(f"{cube_prefix}/"):
+                error_msg = f"Datacube {cube_prefix} exists but has no {ZMETADATA} (not a Zarr v2 store?)"
+                logger.error(error_msg)
+                raise RuntimeError(error_msg)
+            return None
+
+        buffer = io.BytesIO()
+        self._azure_storage.download_to_stream(zmetadata_blob, buffer)
+        return json.loads(buffer.getvalue())
+
+    @activity.defn(name="zonal_stats")
+    async def zonal_stats(self, tif_file_name: str, shape_file_name: str, zone_field=None,
+                          output_format="parquet") -> str:
+        info = activity.info()
+        tif_blob = f"{info.workflow_id}/{tif_file_name}"
+
+        async def compute(workspace):
+            work_dir = str(workspace.path)
+            shapefile_zip = await self._run_io(self._azure_storage.download_file, shape_file_name, work_dir)
+            return await self._run_raster_on_blobs(
+                zonal_stats, tif_blob, work_dir, shapefile_zip, zone_field, output_format, work_dir=work_dir)
+
+        return await self._memoized(
+            "zonal_stats", zonal_stats, [tif_blob, shape_file_name],
+            {"zone_field": zone_field, "output_format": output_format},
+            f"zonal_stats_{Path(tif_file_name).stem}.{output_format}", compute)
+
+
+def mosdac_manifest_blob(remote_path: str) -> str:
+    digest = hashlib.sha256(remote_path.encode()).hexdigest()[:16]
+    return f"manifests/mosdac/{digest}.json"
+
+
+def _file_signatures(root: Path) -> dict[Path, tuple[int, int]]:
+    return {path: (path.stat().st_size, path.stat().st_mtime_ns) for path in root.rglob("*") if path.is_file()}
 
-        hdf_file = self._azure_storage.download_file(f"{workflow_id}/{hdf_file_name}")
-        geotif_file = convert_hdf_to_geotiff(hdf_file, required_dataset)
 
-        self._azure_storage.upload_bytes(f"{workflow_id}/{geotif_file.name}", read_file_to_bytes(geotif_file))
-        return geotif_file.name
+def _import_io_libraries():
+    import paramiko  # noqa: F401
+    import earthaccess  # noqa: F401
+    import geopandas  # noqa: F401
 
 
-def read_file_to_bytes(file_path: Path):
-    """Reads a file and returns its content as bytes."""
-    with open(file_path, 'rb') as file:
-        file_bytes = file.read()
-    return file_bytes
+async def _run_in(executor: Executor, fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, fn, *args)
@@ -0,0 +1,93 @@
+import os
+import math
+import logging
+from pathlib import Path
+
+from gdal_profiles import gtiff_creation_options
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Resampling algorithms the COG driver accepts for overviews, by their gdal.Warp names.
+OVERVIEW_RESAMPLING_ALGORITHMS = ('near', 'average', 'bilinear', 'cubic', 'cubicspline', 'lanczos', 'mode', 'rms')
+
+DEFAULT_OVERVIEW_RESAMPLING = "bilinear"
+
+# Three levels give the 1/2, 1/4 and 1/8 pyramids behind the common scale factors.
+DEFAULT_OVERVIEW_LEVELS = 3
+
+# Dataset metadata item recording how the overviews were resampled, so scale_tiff
+# only serves a level when it matches the resampling it was asked for.
+OVERVIEW_RESAMPLING_KEY = "OVERVIEW_RESAMPLING"
+
+
+def scaled_size(size: int, scale_factor: float) -> int:
+    """
+    Output size of a `scale_factor` resample. Rounds up like GDAL's overview
+    levels do, so a warp and a copied overview level produce the same grid.
+    """
+    return max(1, math.ceil(size * scale_factor - 1e-9))
+
+
+def cog_options(resampling=DEFAULT_OVERVIEW_RESAMPLING, levels=DEFAULT_OVERVIEW_LEVELS, compress=None, num_threads=None) -> dict:
+    """Keyword arguments for gdal.TranslateOptions writing a COG with internal overviews."""
+    if resampling not in OVERVIEW_RESAMPLING_ALGORITHMS:
+        error_msg = (f"Unsupported overview resampling '{resampling}'. "
+                     f"Choose one of: {', '.join(OVERVIEW_RESAMPLING_ALGORITHMS)}")
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    cog_resampling = "NEAREST" if resampling == "near" else resampling.upper()
+    return {
+        "format": "COG",
+        "creationOptions": gtiff_creation_options(compress, num_threads, cog=True) + [
+            f"OVERVIEW_RESAMPLING={cog_resampling}",
+            f"OVERVIEW_COUNT={levels}",
+        ],
+        "metadataOptions": [f"{OVERVIEW_RESAMPLING_KEY}={resampling}"],
+    }
+
+
+def to_cloud_optimized(tiff_path: str, resampling=DEFAULT_OVERVIEW_RESAMPLING, levels=DEFAULT_OVERVIEW_LEVELS) -> Path:
+    """Rewrite a GeoTIFF in place as a COG with `levels` internal overviews."""
+    from osgeo import gdal
+
+    tiff_path = Path(tiff_path)
+    tmp_path = tiff_path.with_name(f".cog_{tiff_path.name}")
+
+    src_ds = gdal.Open(str(tiff_path), gdal.GA_ReadOnly)
+    if src_ds is None:
+        error_msg = f"Could not open input file: {tiff_path}"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    dst_ds = gdal.Translate(str(tmp_path), src_ds, options=gdal.TranslateOptions(**cog_options(resampling, levels)))
+    if dst_ds is None:
+        error_msg = f"Could not create output file: {tmp_path}"
+        logger.error(error_msg)
+        raise RuntimeError(error_msg)
+
+    dst_ds = None
+    src_ds = None
+    os.replace(tmp_path, tiff_path)
+
+    logger.info(f"Added {levels} {resampling} overview levels to {tiff_path}")
+    return tiff_path
+
+
+def matching_overview(src_ds, scale_factor: float, resampling: str) -> int | None:
+    """Index of the overview level of `src_ds` that equals a `scale_factor` resample, if any."""
+    recorded = src_ds.GetMetadataItem(OVERVIEW_RESAMPLING_KEY)
+    if recorded is None or recorded != resampling:
+        return None
+
+    target_width = scaled_size(src_ds.RasterXSize, scale_factor)
+    target_height = scaled_size(src_ds.RasterYSize, scale_factor)
+    band = src_ds.GetRasterBand(1)
+    for level in range(band.GetOverviewCount()):
+        overview = band.GetOverview(level)
+        if overview.XSize == target_width and overview.YSize == target_height:
+            return level
+
+    return None
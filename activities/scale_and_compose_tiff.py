@@ -0,0 +1,77 @@
+import uuid
+import logging
+import tempfile
+from pathlib import Path
+
+from activities.scale_tiff import RESAMPLING_ALGORITHMS
+from activities.compose_tiff import compose_tiff
+from gdal_profiles import gtiff_creation_options
+from activities.overviews import scaled_size, DEFAULT_OVERVIEW_RESAMPLING, DEFAULT_OVERVIEW_LEVELS
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def scale_and_compose_tiff(input_tiffs: list[str],
+                           scale_factor=0.5,
+                           resampling="bilinear",
+                           output_name="composed_output.tif",
+                           cache_mb=None,
+                           keep_intermediates=False,
+                           overview_resampling=DEFAULT_OVERVIEW_RESAMPLING,
+                           overview_levels=DEFAULT_OVERVIEW_LEVELS,
+                           work_dir=None) -> tuple[Path, list[Path]]:
+    """
+    Scale every input and mosaic the results in one pass.
+
+    Each input is described by a warped VRT in GDAL's in-memory filesystem, so
+    scaled pixels are computed on demand while the mosaic is written and no
+    per-file intermediate ever touches disk. With `keep_intermediates` the
+    scaled files are also materialized (for debugging) and returned.
+    """
+    from osgeo import gdal
+
+    if resampling not in RESAMPLING_ALGORITHMS:
+        error_msg = f"Unsupported resampling '{resampling}'. Choose one of: {', '.join(RESAMPLING_ALGORITHMS)}"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    run_id = uuid.uuid4().hex
+    vrt_paths = []
+    intermediates = []
+    intermediate_dir = Path(tempfile.mkdtemp(prefix="scale_compose_", dir=work_dir)) if keep_intermediates else None
+
+    try:
+        for idx, input_tiff in enumerate(input_tiffs):
+            src_ds = gdal.Open(input_tiff, gdal.GA_ReadOnly)
+            if src_ds is None:
+                error_msg = f"Could not open input file: {input_tiff}"
+                logger.error(error_msg)
+                raise ValueError(error_msg)
+
+            vrt_path = f"/vsimem/scale_{run_id}_{idx}.vrt"
+            warp_options = gdal.WarpOptions(
+                format="VRT",
+                width=scaled_size(src_ds.RasterXSize, scale_factor),
+                height=scaled_size(src_ds.RasterYSize, scale_factor),
+                resampleAlg=resampling,
+            )
+            gdal.Warp(vrt_path, src_ds, options=warp_options)
+            src_ds = None
+            vrt_paths.append(vrt_path)
+
+            if keep_intermediates:
+                intermediate = intermediate_dir.joinpath(f"scaled_{Path(input_tiff).name}")
+                gdal.Translate(str(intermediate), vrt_path, format="GTiff",
+                               creationOptions=gtiff_creation_options())
+                intermediates.append(intermediate)
+
+        logger.info(f"Composing {len(vrt_paths)} inputs scaled by {scale_factor} ({resampling})")
+        composed = compose_tiff(vrt_paths, output_name, cache_mb, overview_resampling=overview_resampling,
+                                overview_levels=overview_levels, work_dir=work_dir)
+    finally:
+        for vrt_path in vrt_paths:
+            gdal.Unlink(vrt_path)
+
+    return composed, intermediates
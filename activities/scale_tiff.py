@@ -3,16 +3,44 @@ import tempfile
 import logging
 from pathlib import Path
 
+import telemetry
+from gdal_profiles import gtiff_creation_options
+from activities.overviews import matching_overview, scaled_size
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-
-def scale_tiff(original_tif: str, scale_factor=0.5) -> Path:
+# Resampling algorithms accepted by gdal.Warp.
+RESAMPLING_ALGORITHMS = ('near', 'bilinear', 'cubic', 'cubicspline', 'lanczos', 'average', 'mode',
+                         'max', 'min', 'med', 'q1', 'q3', 'sum', 'rms')
+
+
+def scale_tiff(original_tif: str,
+               scale_factor=0.5,
+               resampling="bilinear",
+               num_threads=None,
+               warp_memory_mb=512,
+               compress=None,
+               use_overviews=True,
+               work_dir=None) -> Path:
+    """
+    Resample `original_tif` by `scale_factor`.
+
+    When the input carries internal overviews built with the same resampling
+    and one level matches the factor (see `activities.overviews`), that level is
+    copied out instead of warping the full-resolution image. Without
+    `num_threads` the active GDAL profile's thread settings apply.
+    """
     from osgeo import gdal
 
     logger.info(f"Scaling tiff {original_tif}")
 
+    if resampling not in RESAMPLING_ALGORITHMS:
+        error_msg = f"Unsupported resampling '{resampling}'. Choose one of: {', '.join(RESAMPLING_ALGORITHMS)}"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
     src_ds = gdal.Open(original_tif, gdal.GA_ReadOnly)
     if src_ds is None:
         error_msg = f"Could not open input file: {original_tif}"
@@ -24,32 +52,37 @@ def scale_tiff(original_tif: str, scale_factor=0.5) -> Path:
     src_height = src_ds.RasterYSize
 
     # Calculate the new dimensions
-    dst_width = int(src_width * scale_factor)
-    dst_height = int(src_height * scale_factor)
-
-    logger.info(f"Scaling GeoTIFF from {src_width}x{src_height} to {dst_width}x{dst_height}")
-
-    # Get other parameters from the source dataset
-    band_count = src_ds.RasterCount
-    data_type = src_ds.GetRasterBand(1).DataType
-
-    # Get geotransform and adjust it according to the scale factor
-    geotransform = list(src_ds.GetGeoTransform())
-    # Scale the pixel width and height (elements 1 and 5)
-    geotransform[1] = geotransform[1] / scale_factor  # Pixel width
-    geotransform[5] = geotransform[5] / scale_factor  # Pixel height (negative for north-up images)
-
-    # Get projection
-    projection = src_ds.GetProjection()
-
-    # Create the output dataset
-    driver = gdal.GetDriverByName('GTiff')
+    dst_width = scaled_size(src_width, scale_factor)
+    dst_height = scaled_size(src_height, scale_factor)
 
     original_tif_file_name = Path(original_tif).name
-    temp_dir = tempfile.mkdtemp(prefix="scale_tif_")
+    temp_dir = tempfile.mkdtemp(prefix="scale_tif_", dir=work_dir)
     output_tif_path = Path(temp_dir).joinpath(f"scaled_{original_tif_file_name}")
 
-    dst_ds = driver.Create(str(output_tif_path), dst_width, dst_height, band_count, data_type)
+    overview_level = matching_overview(src_ds, scale_factor, resampling) if use_overviews else None
+    if overview_level is not None:
+        src_ds = None
+        return _copy_overview(original_tif, overview_level, output_tif_path, compress, num_threads)
+
+    logger.info(f"Scaling GeoTIFF from {src_width}x{src_height} to {dst_width}x{dst_height} ({resampling})")
+    telemetry.observe_raster(src_width, src_height, src_ds.RasterCount)
+
+    # gdal.Warp processes the image in chunks bounded by warpMemoryLimit, splits each
+    # chunk across NUM_THREADS workers and overlaps I/O with computation (multithread).
+    # Nodata, color tables and metadata are carried over from the source.
+    warp_options = gdal.WarpOptions(
+        format='GTiff',
+        width=dst_width,
+        height=dst_height,
+        resampleAlg=resampling,
+        multithread=True,
+        warpMemoryLimit=warp_memory_mb,
+        # Without NUM_THREADS the warper uses the profile's GDAL_NUM_THREADS
+        warpOptions=[f'NUM_THREADS={num_threads}'] if num_threads else [],
+        creationOptions=gtiff_creation_options(compress, num_threads),
+    )
+
+    dst_ds = gdal.Warp(str(output_tif_path), src_ds, options=warp_options)
 
     if dst_ds is None:
         error_msg = f"Could not create output file: {output_tif_path}"
@@ -57,45 +90,6 @@ def scale_tiff(original_tif: str, scale_factor=0.5) -> Path:
         src_ds = None  # Close the dataset
         raise RuntimeError(error_msg)
 
-    # Set the geotransform and projection on the output dataset
-    dst_ds.SetGeoTransform(geotransform)
-    dst_ds.SetProjection(projection)
-
-    # Set up resampling options
-    # Options: 'near', 'bilinear', 'cubic', 'cubicspline', 'lanczos', 'average', 'mode'
-    resampling = gdal.GRA_Bilinear  # Default to bilinear for better quality
-
-    # Process each band
-    for band_idx in range(1, band_count + 1):
-        src_band = src_ds.GetRasterBand(band_idx)
-        dst_band = dst_ds.GetRasterBand(band_idx)
-
-        # Copy nodata value if present
-        nodata_value = src_band.GetNoDataValue()
-        if nodata_value is not None:
-            dst_band.SetNoDataValue(nodata_value)
-
-        # Copy color interpretation if present
-        color_interp = src_band.GetColorInterpretation()
-        dst_band.SetColorInterpretation(color_interp)
-
-        # Copy color table if present
-        color_table = src_band.GetColorTable()
-        if color_table is not None:
-            dst_band.SetColorTable(color_table)
-
-    # Perform the actual resampling
-    gdal.ReprojectImage(
-        src_ds,           # Source dataset
-        dst_ds,           # Destination dataset
-        None,             # Source projection (None = use source dataset's projection)
-        None,             # Destination projection (None = use destination dataset's projection)
-        resampling        # Resampling algorithm
-    )
-
-    # Copy metadata
-    dst_ds.SetMetadata(src_ds.GetMetadata())
-
     # Clean up
     dst_ds.FlushCache()  # Write to disk
     dst_ds = None  # Close the dataset
@@ -105,3 +99,30 @@ def scale_tiff(original_tif: str, scale_factor=0.5) -> Path:
     return output_tif_path
 
 
+def _copy_overview(original_tif: str, level: int, output_tif_path: Path, compress=None, num_threads=None) -> Path:
+    """Write overview `level` of `original_tif` as a standalone GeoTIFF; no resampling happens."""
+    from osgeo import gdal
+
+    # OVERVIEW_LEVEL exposes the level as a dataset with its own size and geotransform;
+    # when reading through /vsiaz/ only that level's blocks are fetched.
+    ovr_ds = gdal.OpenEx(original_tif, gdal.OF_RASTER | gdal.OF_READONLY, open_options=[f"OVERVIEW_LEVEL={level}"])
+    if ovr_ds is None:
+        error_msg = f"Could not open overview level {level} of {original_tif}"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    logger.info(f"Copying overview level {level} ({ovr_ds.RasterXSize}x{ovr_ds.RasterYSize}) of {original_tif}")
+    telemetry.observe_raster(ovr_ds.RasterXSize, ovr_ds.RasterYSize, ovr_ds.RasterCount)
+
+    dst_ds = gdal.Translate(str(output_tif_path), ovr_ds, format="GTiff",
+                            creationOptions=gtiff_creation_options(compress, num_threads))
+    if dst_ds is None:
+        error_msg = f"Could not create output file: {output_tif_path}"
+        logger.error(error_msg)
+        raise RuntimeError(error_msg)
+
+    dst_ds = None
+    ovr_ds = None
+
+    logger.info(f"Successfully scaled GeoTIFF to {output_tif_path}")
+    return output_tif_path
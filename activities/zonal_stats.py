@@ -0,0 +1,149 @@
+import logging
+import tempfile
+from pathlib import Path
+
+import telemetry
+from activities.download_fapar_data import shapefile_vsi_path
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = ("parquet", "csv")
+
+# Rows read per block; bounds memory to roughly block_rows * cols * 12 bytes.
+DEFAULT_BLOCK_ROWS = 512
+
+
+def accumulate_zones(labels, values, counts, sums, mins, maxs):
+    """
+    Fold one block of (label, value) pixels into the per-label running count,
+    sum, min and max arrays, in place. `labels` must be non-negative and smaller
+    than the length of the accumulators.
+    """
+    import numpy as np
+
+    if not labels.size:
+        return
+
+    zone_count = len(counts)
+    counts += np.bincount(labels, minlength=zone_count)
+    sums += np.bincount(labels, weights=values, minlength=zone_count)
+
+    # Sort by label so min/max become one reduceat over contiguous runs
+    order = np.argsort(labels, kind="stable")
+    labels, values = labels[order], values[order]
+    run_starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    run_labels = labels[run_starts]
+    mins[run_labels] = np.minimum(mins[run_labels], np.minimum.reduceat(values, run_starts))
+    maxs[run_labels] = np.maximum(maxs[run_labels], np.maximum.reduceat(values, run_starts))
+
+
+def zonal_stats(raster_path: str,
+                shapefile_zip: str,
+                zone_field=None,
+                output_format="parquet",
+                block_rows=DEFAULT_BLOCK_ROWS,
+                all_touched=False,
+                work_dir=None) -> Path:
+    """
+    Per-polygon count, mean, min and max of band 1 of `raster_path`.
+
+    All polygons are rasterized once into an on-disk label grid aligned with the
+    raster (label 0 = outside every polygon), then both grids are read block by
+    block and reduced per label with NumPy, so the cost is one pass over the
+    pixels regardless of the number of polygons. Where polygons overlap, the
+    pixel counts toward the one drawn last. Zones are identified by `zone_field`
+    when given, otherwise by the feature's position in the shapefile.
+    """
+    import numpy as np
+    import pandas as pd
+    import geopandas as gpd
+    from osgeo import gdal, ogr, osr
+
+    if output_format not in OUTPUT_FORMATS:
+        error_msg = f"Unsupported output format '{output_format}'. Choose one of: {', '.join(OUTPUT_FORMATS)}"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    src_ds = gdal.Open(raster_path, gdal.GA_ReadOnly)
+    if src_ds is None:
+        error_msg = f"Could not open input file: {raster_path}"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    gdf = gpd.read_file(shapefile_vsi_path(shapefile_zip))
+    if zone_field is not None and zone_field not in gdf.columns:
+        error_msg = f"Zone field '{zone_field}' not found. Available fields: {', '.join(gdf.columns.drop('geometry'))}"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    raster_srs = osr.SpatialReference(wkt=src_ds.GetProjection())
+    raster_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    gdf = gdf.to_crs(raster_srs.ExportToWkt())
+
+    cols, rows = src_ds.RasterXSize, src_ds.RasterYSize
+    temp_dir = tempfile.mkdtemp(prefix="zonal_stats_", dir=work_dir)
+
+    # Label grid: feature i is burned as i + 1
+    mem_ds = ogr.GetDriverByName("Memory").CreateDataSource("zones")
+    layer = mem_ds.CreateLayer("zones", raster_srs, ogr.wkbUnknown)
+    layer.CreateField(ogr.FieldDefn("label", ogr.OFTInteger))
+    for label, geometry in enumerate(gdf.geometry, start=1):
+        if geometry is None or geometry.is_empty:
+            continue
+        feature = ogr.Feature(layer.GetLayerDefn())
+        feature.SetField("label", label)
+        feature.SetGeometry(ogr.CreateGeometryFromWkb(geometry.wkb))
+        layer.CreateFeature(feature)
+
+    labels_path = str(Path(temp_dir).joinpath("labels.tif"))
+    labels_ds = gdal.GetDriverByName("GTiff").Create(
+        labels_path, cols, rows, 1, gdal.GDT_Int32, options=["TILED=YES", "COMPRESS=DEFLATE", "SPARSE_OK=TRUE"])
+    labels_ds.SetGeoTransform(src_ds.GetGeoTransform())
+    labels_ds.SetProjection(raster_srs.ExportToWkt())
+    gdal.Rasterize(labels_ds, mem_ds, bands=[1], attribute="label", allTouched=all_touched)
+
+    zone_count = len(gdf) + 1
+    counts = np.zeros(zone_count, dtype=np.int64)
+    sums = np.zeros(zone_count, dtype=np.float64)
+    mins = np.full(zone_count, np.inf)
+    maxs = np.full(zone_count, -np.inf)
+
+    src_band = src_ds.GetRasterBand(1)
+    labels_band = labels_ds.GetRasterBand(1)
+    nodata = src_band.GetNoDataValue()
+    for start_row in range(0, rows, block_rows):
+        block_height = min(block_rows, rows - start_row)
+        values = src_band.ReadAsArray(0, start_row, cols, block_height).astype(np.float64, copy=False).ravel()
+        labels = labels_band.ReadAsArray(0, start_row, cols, block_height).ravel()
+
+        valid = (labels > 0) & ~np.isnan(values)
+        if nodata is not None:
+            valid &= values != nodata
+        accumulate_zones(labels[valid], values[valid], counts, sums, mins, maxs)
+
+    telemetry.observe_raster(cols, rows)
+    labels_ds = None
+    src_ds = None
+
+    counts, sums, mins, maxs = counts[1:], sums[1:], mins[1:], maxs[1:]
+    empty = counts == 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+    table = pd.DataFrame({
+        "zone": gdf[zone_field].to_numpy() if zone_field is not None else np.arange(len(gdf)),
+        "count": counts,
+        "mean": np.where(empty, np.nan, means),
+        "min": np.where(empty, np.nan, mins),
+        "max": np.where(empty, np.nan, maxs),
+    })
+
+    output_table = Path(temp_dir).joinpath(f"zonal_stats_{Path(raster_path).stem}.{output_format}")
+    if output_format == "parquet":
+        table.to_parquet(output_table, index=False)
+    else:
+        table.to_csv(output_table, index=False)
+
+    logger.info(f"Zonal statistics for {len(table)} zones ({int((~empty).sum())} with data) written to {output_table}")
+    return output_table
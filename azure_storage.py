@@ -1,54 +1,387 @@
+import os
+import time
 import logging
 import tempfile
+import threading
+import contextvars
 from pathlib import Path
+from typing import BinaryIO, Callable
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+
+import requests
+from azure.core.exceptions import HttpResponseError, ResourceExistsError
+from azure.core.pipeline.transport import RequestsTransport
 from azure.identity import DefaultAzureCredential
-from azure.storage.blob import BlobServiceClient
+from azure.storage.blob import BlobServiceClient, BlobLeaseClient
+
+import telemetry
+from blob_cache import BlobCache
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+DEFAULT_BLOCK_SIZE_MB = 8
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_CACHE_MAX_GB = 20
+DEFAULT_BULK_MAX_IN_FLIGHT = 16
+STORAGE_TOKEN_SCOPE = "https://storage.azure.com/.default"
+
+# Leases expire unless renewed, so a crashed holder never blocks other writers for long.
+DEFAULT_LEASE_SECONDS = 60
+
+# Blob metadata naming where a blob's bytes came from. Unlike the ETag it survives
+# re-uploads and server-side copies of the same content (see `content_identity`).
+CONTENT_KEY_METADATA = "content_key"
+
 
 class AzureStorage:
     def __init__(self, config: dict[str, str]):
         self._config = config
         self._blob_client = None
+        self._credential = None
+
+        # A connection string (e.g. for a local Azurite emulator) replaces account + Azure AD auth.
+        self._connection_string = (config.get("azure_storage_connection_string")
+                                   or os.getenv("AZURE_STORAGE_CONNECTION_STRING"))
+
+        # Block size used for both staged uploads and ranged downloads. Files are
+        # transferred in chunks of this size so memory never scales with blob size.
+        self._block_size = int(config.get("blob_block_size_mb", DEFAULT_BLOCK_SIZE_MB)) * 1024 * 1024
+        self._max_concurrency = int(config.get("blob_max_concurrency", DEFAULT_MAX_CONCURRENCY))
+
+        # Bulk transfers run up to this many blobs at once on a shared thread pool.
+        self._bulk_max_in_flight = int(config.get("blob_bulk_max_in_flight", DEFAULT_BULK_MAX_IN_FLIGHT))
+        self._bulk_executor = None
+        self._bulk_lock = threading.Lock()
+
+        # Optional local cache of blob contents, keyed by blob name + ETag.
+        self._cache = None
+        cache_dir = config.get("blob_cache_dir")
+        if cache_dir:
+            max_gb = float(config.get("blob_cache_max_gb", DEFAULT_CACHE_MAX_GB))
+            self._cache = BlobCache(cache_dir, int(max_gb * 1024 ** 3))
 
     @property
     def blob_client(self) -> BlobServiceClient:
         if self._blob_client is None:
-            account_name = self._config.get("azure_storage_account")
-            if not account_name:
-                raise ValueError("Missing 'azure_storage_account' in config")
-
-            credential = DefaultAzureCredential()
-            account_url = f"https://{account_name}.blob.core.windows.net"
             try:
-                self._blob_client = BlobServiceClient(account_url=account_url, credential=credential)
+                # One HTTP connection pool for every transfer, sized so a full bulk batch
+                # (each blob split into max_concurrency ranges) never waits on a socket.
+                pool_size = self._bulk_max_in_flight * self._max_concurrency
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                client_options = dict(
+                    transport=RequestsTransport(session=session, session_owner=False),
+                    max_block_size=self._block_size,
+                    max_single_put_size=self._block_size,
+                    max_single_get_size=self._block_size,
+                    max_chunk_get_size=self._block_size,
+                )
+
+                if self._connection_string:
+                    self._blob_client = BlobServiceClient.from_connection_string(
+                        self._connection_string, **client_options)
+                else:
+                    account_url = f"https://{self._account_name()}.blob.core.windows.net"
+                    self._blob_client = BlobServiceClient(
+                        account_url=account_url, credential=self.credential, **client_options)
+            except ValueError:
+                raise
             except Exception as e:
                 logger.exception("Failed to create Azure Blob client")
                 raise RuntimeError("Blob client initialization failed") from e
 
         return self._blob_client
 
-    def download_file(self, blob_name: str) -> str:
-        container_name = self._config["workflows_bucket"]
+    @property
+    def credential(self) -> DefaultAzureCredential:
+        if self._credential is None:
+            self._credential = DefaultAzureCredential()
+        return self._credential
 
+    def _account_name(self) -> str:
+        account_name = self._config.get("azure_storage_account")
+        if not account_name:
+            raise ValueError("Missing 'azure_storage_account' in config")
+        return account_name
+
+    def vsi_path(self, blob_name: str) -> str:
+        """Path under GDAL's /vsiaz/ filesystem for a blob in the workflows bucket."""
+        return f"/vsiaz/{self._config['workflows_bucket']}/{blob_name}"
+
+    def gdal_config(self) -> dict[str, str]:
+        """
+        GDAL config options that let /vsiaz/ read this storage account with the
+        same credentials as the blob client. Azure AD tokens are short-lived, so
+        fetch these per activity rather than once per worker.
+        """
+        if self._connection_string:
+            # GDAL honours BlobEndpoint in connection strings, which is how Azurite is reached.
+            return {"AZURE_STORAGE_CONNECTION_STRING": self._connection_string}
+
+        try:
+            token = self.credential.get_token(STORAGE_TOKEN_SCOPE).token
+        except Exception as e:
+            logger.exception("Failed to acquire a storage access token for GDAL")
+            raise RuntimeError("Storage token acquisition failed") from e
+
+        return {"AZURE_STORAGE_ACCOUNT": self._account_name(), "AZURE_STORAGE_ACCESS_TOKEN": token}
+
+    def download_file(self, blob_name: str, work_dir: str | None = None) -> str:
+        """Download a blob into a fresh temp directory (under `work_dir` if given) and return the local path."""
         file_name = Path(blob_name).name
-        temp_dir = tempfile.mkdtemp(prefix="azure_download_")
+        temp_dir = tempfile.mkdtemp(prefix="azure_download_", dir=work_dir)
         tmp_file_path = Path(temp_dir).joinpath(file_name)
 
+        self.download_to_path(blob_name, tmp_file_path)
+        return str(tmp_file_path)
+
+    def download_files(self, blob_names: list[str], work_dir: str | None = None) -> list[str]:
+        """Download many blobs concurrently (see `download_file`); returns local paths in input order."""
+        return self._bulk(self.download_file, [(blob_name, work_dir) for blob_name in blob_names])
+
+    def download_prefix(self, prefix: str, local_root: str | Path,
+                        include: Callable[[str], bool] | None = None) -> list[Path]:
+        """
+        Download the blobs under the `prefix` folder into `local_root`, keeping relative
+        paths (e.g. a Zarr store), optionally only those whose relative path passes
+        `include`. Files are written directly rather than through the cache, so
+        callers may modify them in place.
+        """
+        # List the folder only, not siblings sharing the name prefix (e.g. "<store>.lock").
+        prefix = f"{prefix.rstrip('/')}/"
+        local_root = Path(local_root)
+        downloads = []
+        for blob_name in self.list_blobs(prefix):
+            relative_path = blob_name[len(prefix):]
+            if include is not None and not include(relative_path):
+                continue
+            file_path = local_root.joinpath(relative_path)
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            downloads.append((blob_name, file_path))
+
+        self._bulk(self._download_new_file, downloads)
+        return [file_path for _, file_path in downloads]
+
+    def _download_new_file(self, blob_name: str, file_path: Path):
+        with open(file_path, "wb") as f:
+            self._download_into(blob_name, f)
+
+    def download_to_path(self, blob_name: str, file_path: str | Path) -> Path:
+        """Stream a blob to `file_path` in chunks, serving it from the local cache when possible."""
+        file_path = Path(file_path)
+
+        if self._cache is not None:
+            etag = self.get_etag(blob_name)
+            if self._cache.get(blob_name, etag, file_path):
+                telemetry.add("blob_cache_hits", 1)
+                logger.info("Blob cache hit for %s: %s", blob_name, file_path)
+                return file_path
+            telemetry.add("blob_cache_misses", 1)
+
+        with open(file_path, "wb") as f:
+            etag = self._download_into(blob_name, f)
+
+        if self._cache is not None:
+            self._cache.put(blob_name, etag, file_path)
+
+        logger.info("File downloaded successfully: %s", file_path)
+        return file_path
+
+    def download_to_stream(self, blob_name: str, stream: BinaryIO) -> str:
+        """Stream a blob into a writable file object using parallel ranged reads. Returns the ETag."""
+        return self._download_into(blob_name, stream)
+
+    def _download_into(self, blob_name: str, stream: BinaryIO) -> str:
+        container_name = self._config["workflows_bucket"]
+
         try:
             blob = self.blob_client.get_blob_client(container=container_name, blob=blob_name)
-            with open(tmp_file_path, "wb") as f:
-                stream = blob.download_blob()
-                f.write(stream.readall())
+            downloader = blob.download_blob(max_concurrency=self._max_concurrency)
+            telemetry.add("blob_downloaded_bytes", downloader.readinto(stream))
+            return downloader.properties.etag
         except Exception as e:
             logger.exception(f"Failed to download blob '{blob_name}'")
             raise RuntimeError(f"Download failed for blob '{blob_name}'") from e
 
-        logger.info("File downloaded successfully: %s", tmp_file_path)
-        return str(tmp_file_path)
+    def get_etag(self, blob_name: str) -> str:
+        container_name = self._config["workflows_bucket"]
+
+        try:
+            blob = self.blob_client.get_blob_client(container=container_name, blob=blob_name)
+            return blob.get_blob_properties().etag
+        except Exception as e:
+            logger.exception(f"Failed to read properties of blob '{blob_name}'")
+            raise RuntimeError(f"Property lookup failed for blob '{blob_name}'") from e
+
+    def content_identity(self, blob_name: str) -> str:
+        """The blob's content key if one was recorded, otherwise its ETag."""
+        container_name = self._config["workflows_bucket"]
+
+        try:
+            blob = self.blob_client.get_blob_client(container=container_name, blob=blob_name)
+            props = blob.get_blob_properties()
+        except Exception as e:
+            logger.exception(f"Failed to read properties of blob '{blob_name}'")
+            raise RuntimeError(f"Property lookup failed for blob '{blob_name}'") from e
+
+        return (props.metadata or {}).get(CONTENT_KEY_METADATA) or props.etag
+
+    def cache_stats(self) -> dict[str, int]:
+        return self._cache.stats() if self._cache is not None else {}
+
+    def upload_file(self, blob_name: str, file_path: str | Path, metadata: dict[str, str] | None = None) -> str:
+        """Stream a local file to `blob_name` as parallel staged blocks."""
+        with open(file_path, "rb") as f:
+            blob_url, etag = self._upload_from(blob_name, f, metadata)
+
+        # The uploaded bytes are already on local disk; keep them for the next reader.
+        if self._cache is not None:
+            self._cache.put(blob_name, etag, file_path)
+
+        return blob_url
+
+    def upload_files(self, uploads: list[tuple[str, str | Path]]) -> list[str]:
+        """
+        Upload many (blob_name, file_path) or (blob_name, file_path, metadata) entries
+        concurrently; returns blob URLs in input order.
+        """
+        return self._bulk(self.upload_file, uploads)
+
+    def upload_stream(self, blob_name: str, stream: BinaryIO) -> str:
+        """Upload a readable file object without reading it fully into memory."""
+        blob_url, _ = self._upload_from(blob_name, stream)
+        return blob_url
+
+    def _upload_from(self, blob_name: str, stream: BinaryIO,
+                     metadata: dict[str, str] | None = None) -> tuple[str, str]:
+        container_name = self._config["workflows_bucket"]
+
+        try:
+            blob = self.blob_client.get_blob_client(container=container_name, blob=blob_name)
+            start = stream.tell()
+            result = blob.upload_blob(stream, overwrite=True, max_concurrency=self._max_concurrency,
+                                      metadata=metadata)
+            telemetry.add("blob_uploaded_bytes", stream.tell() - start)
+        except Exception as e:
+            logger.exception(f"Failed to upload data to blob '{blob_name}'")
+            raise RuntimeError(f"Upload failed for blob '{blob_name}'") from e
+
+        blob_url = blob.url
+        logger.info("Data uploaded successfully: %s", blob_url)
+        return blob_url, result["etag"]
+
+    def list_blobs(self, prefix: str) -> dict[str, str]:
+        """Names and ETags of the blobs under `prefix`."""
+        container_name = self._config["workflows_bucket"]
+
+        try:
+            container = self.blob_client.get_container_client(container_name)
+            return {blob.name: blob.etag for blob in container.list_blobs(name_starts_with=prefix)}
+        except Exception as e:
+            logger.exception(f"Failed to list blobs under '{prefix}'")
+            raise RuntimeError(f"Listing failed for prefix '{prefix}'") from e
+
+    def acquire_lease(self, blob_name: str, duration: int = DEFAULT_LEASE_SECONDS) -> BlobLeaseClient:
+        """
+        Take an exclusive lease on `blob_name`, creating it empty first if needed.
+        The holder must `renew()` it within `duration` seconds and `release()` it
+        when done. Raises RuntimeError while someone else holds it.
+        """
+        container_name = self._config["workflows_bucket"]
+
+        try:
+            blob = self.blob_client.get_blob_client(container=container_name, blob=blob_name)
+            try:
+                blob.upload_blob(b"", overwrite=False)
+            except ResourceExistsError:
+                pass
+            return blob.acquire_lease(lease_duration=duration)
+        except HttpResponseError as e:
+            if e.status_code == 409:
+                error_msg = f"Blob '{blob_name}' is leased by another writer"
+                logger.warning(error_msg)
+                raise RuntimeError(error_msg) from e
+            logger.exception(f"Failed to lease blob '{blob_name}'")
+            raise RuntimeError(f"Lease failed for blob '{blob_name}'") from e
+
+    def exists(self, blob_name: str) -> bool:
+        container_name = self._config["workflows_bucket"]
+
+        try:
+            blob = self.blob_client.get_blob_client(container=container_name, blob=blob_name)
+            return blob.exists()
+        except Exception as e:
+            logger.exception(f"Failed to check existence of blob '{blob_name}'")
+            raise RuntimeError(f"Existence check failed for blob '{blob_name}'") from e
+
+    def copy_blob(self, src_blob_name: str, dst_blob_name: str, metadata: dict[str, str] | None = None) -> str:
+        """
+        Server-side copy within the workflows bucket; no data passes through this worker.
+        The copy keeps the source's metadata unless `metadata` is given.
+        """
+        container_name = self._config["workflows_bucket"]
+
+        try:
+            src = self.blob_client.get_blob_client(container=container_name, blob=src_blob_name)
+            dst = self.blob_client.get_blob_client(container=container_name, blob=dst_blob_name)
+            dst.start_copy_from_url(src.url, metadata=metadata)
+
+            props = dst.get_blob_properties()
+            while props.copy.status == "pending":
+                time.sleep(1)
+                props = dst.get_blob_properties()
+            if props.copy.status != "success":
+                raise RuntimeError(f"Copy finished with status '{props.copy.status}': {props.copy.status_description}")
+
+            # Same bytes under a new name: let the local cache serve the copy too.
+            if self._cache is not None:
+                self._cache.alias(src_blob_name, src.get_blob_properties().etag, dst_blob_name, props.etag)
+        except Exception as e:
+            logger.exception(f"Failed to copy blob '{src_blob_name}' to '{dst_blob_name}'")
+            raise RuntimeError(f"Copy failed for blob '{src_blob_name}'") from e
+
+        logger.info("Blob copied successfully: %s -> %s", src_blob_name, dst_blob_name)
+        return dst.url
+
+    def copy_blobs(self, copies: list[tuple[str, str]]) -> list[str]:
+        """Run many (src_blob_name, dst_blob_name[, metadata]) server-side copies concurrently."""
+        return self._bulk(self.copy_blob, copies)
+
+    def _bulk(self, fn: Callable, calls: list[tuple]) -> list:
+        """
+        Run `fn(*args)` for every entry in `calls` with at most `blob_bulk_max_in_flight`
+        in flight, so large batches are bound by bandwidth rather than per-blob latency.
+        The first failure cancels transfers that have not started and is re-raised.
+        """
+        if not calls:
+            return []
+
+        with self._bulk_lock:
+            if self._bulk_executor is None:
+                self._bulk_executor = ThreadPoolExecutor(
+                    max_workers=self._bulk_max_in_flight, thread_name_prefix="blob_bulk")
+
+        # Each transfer runs in a copy of the caller's context so telemetry reaches the activity.
+        futures = [self._bulk_executor.submit(contextvars.copy_context().run, fn, *args) for args in calls]
+        done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+        for future in not_done:
+            future.cancel()
+
+        failed = next((f for f in futures if f in done and f.exception() is not None), None)
+        if failed is not None:
+            wait(not_done)
+            raise failed.exception()
+
+        logger.info("Bulk %s finished for %d blobs", fn.__name__, len(calls))
+        return [future.result() for future in futures]
+
+    def close(self):
+        if self._bulk_executor is not None:
+            self._bulk_executor.shutdown(wait=False, cancel_futures=True)
 
     def upload_bytes(self, blob_name: str, data: bytes) -> str:
         container_name = self._config["workflows_bucket"]
@@ -56,6 +389,7 @@ class AzureStorage:
         try:
             blob = self.blob_client.get_blob_client(container=container_name, blob=blob_name)
             blob.upload_blob(data, overwrite=True)
+            telemetry.add("blob_uploaded_bytes", len(data))
         except Exception as e:
             logger.exception(f"Failed to upload data to blob '{blob_name}'")
             raise RuntimeError(f"Upload failed for blob '{blob_name}'") from e
@@ -0,0 +1,199 @@
+"""
+Microbenchmarks for the raster activities using synthetic inputs.
+
+Generates GeoTIFFs and MODIS-style HDF4 files locally, times scale_tiff,
+compose_tiff and convert_hdf_to_geotiff on them, and records peak RSS and
+bytes written. Needs no Azure or Earthdata access.
+
+    python -m benchmarks.raster_benchmarks                      # run and compare with baseline
+    python -m benchmarks.raster_benchmarks --save-baseline      # record a new baseline
+    python -m benchmarks.raster_benchmarks --sizes 1024 4096 --bands 1 3
+"""
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import resource
+import multiprocessing
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent.joinpath("baseline.json")
+DEFAULT_SIZES = [1024, 4096]
+DEFAULT_BANDS = [1, 3]
+
+# MODIS sinusoidal tile h25v06, used to give synthetic HDFs realistic georeferencing.
+MODIS_UL = (7783653.637667, 3335851.559)
+MODIS_LR = (8895604.157333, 2223901.039333)
+MODIS_FILL_VALUE = 255
+
+
+def make_geotiff(path: Path, size: int, bands: int, x_offset: int = 0):
+    """Write a size x size UInt16 GeoTIFF with smooth gradients plus noise."""
+    import numpy as np
+    from osgeo import gdal, osr
+
+    driver = gdal.GetDriverByName("GTiff")
+    ds = driver.Create(str(path), size, size, bands, gdal.GDT_UInt16, options=["TILED=YES"])
+    ds.SetGeoTransform((70.0 + x_offset * 0.001, 0.001, 0.0, 30.0, 0.0, -0.001))
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    ds.SetProjection(srs.ExportToWkt())
+
+    rng = np.random.default_rng(size + bands)
+    rows_per_block = 512
+    for band_idx in range(1, bands + 1):
+        band = ds.GetRasterBand(band_idx)
+        band.SetNoDataValue(0)
+        for row in range(0, size, rows_per_block):
+            n = min(rows_per_block, size - row)
+            y, x = np.mgrid[row:row + n, 0:size]
+            block = ((x + y * band_idx) % 4000 + rng.integers(0, 50, (n, size))).astype(np.uint16)
+            band.WriteArray(block, 0, row)
+    ds = None
+
+
+def make_modis_hdf(path: Path, size: int, dataset="Fpar_500m"):
+    """Write an HDF4 file shaped like a MODIS LAI/FPAR tile."""
+    import numpy as np
+    from pyhdf.SD import SD, SDC
+
+    hdf = SD(str(path), SDC.WRITE | SDC.CREATE)
+    hdf.attr("StructMetadata.0").set(
+        SDC.CHAR,
+        f"UpperLeftPointMtrs=({MODIS_UL[0]},{MODIS_UL[1]})\n"
+        f"LowerRightMtrs=({MODIS_LR[0]},{MODIS_LR[1]})\n")
+
+    sds = hdf.create(dataset, SDC.UINT8, (size, size))
+    sds.attr("_FillValue").set(SDC.UINT8, MODIS_FILL_VALUE)
+    sds.attr("scale_factor").set(SDC.FLOAT64, 0.01)
+    sds.attr("add_offset").set(SDC.FLOAT64, 0.0)
+
+    rng = np.random.default_rng(size)
+    data = rng.integers(0, 101, (size, size), dtype=np.uint8)
+    data[rng.random((size, size)) < 0.05] = MODIS_FILL_VALUE
+    sds[:] = data
+    sds.endaccess()
+    hdf.end()
+
+
+def _run_case(name: str, fn_path: str, args: tuple, queue):
+    """Child process body: run one benchmark case and report timings and peak RSS."""
+    import importlib
+
+    module_name, fn_name = fn_path.rsplit(":", 1)
+    fn = getattr(importlib.import_module(module_name), fn_name)
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    output = Path(fn(*args))
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    bytes_written = sum(f.stat().st_size for f in output.parent.iterdir() if f.is_file())
+    shutil.rmtree(output.parent, ignore_errors=True)
+
+    # ru_maxrss is KiB on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put({"case": name, "wall_s": wall, "cpu_s": cpu, "peak_rss_mb": peak_rss_mb,
+               "bytes_written": bytes_written})
+
+
+def run_case(name: str, fn_path: str, *args) -> dict:
+    # A fresh process per case so peak RSS is attributable to that case alone.
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_case, args=(name, fn_path, args, queue))
+    proc.start()
+    proc.join()
+    if proc.exitcode != 0:
+        raise RuntimeError(f"Benchmark case '{name}' failed with exit code {proc.exitcode}")
+
+    result = queue.get()
+    logger.info(f"{name}: {result['wall_s']:.2f}s wall, {result['cpu_s']:.2f}s cpu, "
+                f"{result['peak_rss_mb']:.0f} MB peak RSS, {result['bytes_written']} bytes written")
+    return result
+
+
+def run_benchmarks(sizes: list[int], bands: list[int], fixture_dir: Path) -> list[dict]:
+    results = []
+
+    for size in sizes:
+        hdf = fixture_dir.joinpath(f"MCD15A2H.A2024361.h25v06.{size}.hdf")
+        make_modis_hdf(hdf, size)
+        results.append(run_case(f"convert_hdf_to_geotiff/{size}",
+                                "activities.convert_hdf_to_geotiff:convert_hdf_to_geotiff", str(hdf)))
+
+        for band_count in bands:
+            tiles = []
+            for i in range(4):
+                tif = fixture_dir.joinpath(f"synthetic_{size}_{band_count}b_{i}.tif")
+                make_geotiff(tif, size, band_count, x_offset=i * size)
+                tiles.append(str(tif))
+
+            results.append(run_case(f"scale_tiff/{size}x{size}x{band_count}/0.5",
+                                    "activities.scale_tiff:scale_tiff", tiles[0], 0.5))
+            results.append(run_case(f"compose_tiff/4x{size}x{size}x{band_count}",
+                                    "activities.compose_tiff:compose_tiff", tiles))
+
+    return results
+
+
+def compare_with_baseline(results: list[dict], baseline: dict[str, dict], threshold: float) -> list[str]:
+    """Return a description of every metric that regressed by more than `threshold` (a fraction)."""
+    regressions = []
+    for result in results:
+        previous = baseline.get(result["case"])
+        if previous is None:
+            continue
+        for metric in ("wall_s", "peak_rss_mb", "bytes_written"):
+            old, new = previous.get(metric), result[metric]
+            if old and new > old * (1 + threshold):
+                regressions.append(f"{result['case']} {metric}: {old:.2f} -> {new:.2f} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark raster activities on synthetic data")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Raster edge lengths in pixels")
+    parser.add_argument("--bands", type=int, nargs="+", default=DEFAULT_BANDS, help="Band counts for GeoTIFF cases")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Overwrite the baseline with this run")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed regression as a fraction")
+    parser.add_argument("--output", type=Path, help="Also write results as JSON to this path")
+    args = parser.parse_args()
+
+    fixture_dir = Path(tempfile.mkdtemp(prefix="raster_bench_"))
+    try:
+        results = run_benchmarks(args.sizes, args.bands, fixture_dir)
+    finally:
+        shutil.rmtree(fixture_dir, ignore_errors=True)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps({r["case"]: r for r in results}, indent=2))
+        logger.info(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        logger.warning(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+
+    regressions = compare_with_baseline(results, json.loads(args.baseline.read_text()), args.threshold)
+    for regression in regressions:
+        logger.error(f"Regression: {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import os
+import shutil
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class BlobCache:
+    """
+    On-disk cache of blob contents keyed by (blob name, ETag).
+
+    Each entry lives in its own directory under `root` so the original file
+    name is preserved (GDAL and pyhdf sniff drivers from the extension).
+    Entries are evicted least-recently-used first once the total size exceeds
+    `max_bytes`. Aliases of an entry are hard links to the same inode, so its
+    bytes count once until the last of them is gone. Recency is persisted through file mtimes so a restarted
+    worker keeps its warm cache.
+    """
+
+    def __init__(self, root: str | Path, max_bytes: int):
+        self._root = Path(root)
+        self._root.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[Path, int, int]] = OrderedDict()
+        self._links: dict[int, int] = {}  # entries per inode
+        self._total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._load_existing()
+
+    @staticmethod
+    def _key(blob_name: str, etag: str) -> str:
+        return hashlib.sha256(f"{blob_name}\0{etag}".encode()).hexdigest()
+
+    def _load_existing(self):
+        found = []
+        for entry_dir in self._root.iterdir():
+            files = [f for f in entry_dir.iterdir() if f.is_file()] if entry_dir.is_dir() else []
+            if entry_dir.name.startswith(".") or len(files) != 1:
+                # Half-written or foreign entry; drop it.
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                continue
+            stat = files[0].stat()
+            found.append((stat.st_mtime, entry_dir.name, files[0], stat.st_size, stat.st_ino))
+
+        for _, key, path, size, inode in sorted(found):
+            self._add(key, path, size, inode)
+
+        logger.info(f"Blob cache at {self._root}: {len(self._entries)} entries, {self._total_bytes} bytes")
+        with self._lock:
+            self._evict()
+
+    def get(self, blob_name: str, etag: str, dst: str | Path) -> bool:
+        """Materialize the cached blob version at `dst`; return False on a miss."""
+        key = self._key(blob_name, etag)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not entry[0].exists():
+                if entry is not None:
+                    self._forget(key)
+                self.misses += 1
+                return False
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            os.utime(entry[0])
+            link_or_copy(entry[0], dst)
+            return True
+
+    def put(self, blob_name: str, etag: str, file_path: str | Path):
+        """Add a local file to the cache under this blob version."""
+        key = self._key(blob_name, etag)
+        file_path = Path(file_path)
+        entry_dir = self._root.joinpath(key)
+        tmp_dir = self._root.joinpath(f".{key}.{threading.get_ident()}.tmp")
+
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir()
+        cached = tmp_dir.joinpath(Path(blob_name).name)
+        link_or_copy(file_path, cached)
+        stat = cached.stat()
+
+        with self._lock:
+            if key in self._entries:
+                self._forget(key)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            tmp_dir.rename(entry_dir)
+
+            self._add(key, entry_dir.joinpath(cached.name), stat.st_size, stat.st_ino)
+            self._evict()
+
+    def alias(self, src_blob_name: str, src_etag: str, dst_blob_name: str, dst_etag: str) -> bool:
+        """Register the cached bytes of `src` under a server-side copy `dst`; False if `src` isn't cached."""
+        with self._lock:
+            entry = self._entries.get(self._key(src_blob_name, src_etag))
+        if entry is None or not entry[0].exists():
+            return False
+
+        try:
+            self.put(dst_blob_name, dst_etag, entry[0])
+        except FileNotFoundError:
+            # Evicted between the lookup and the link
+            return False
+        return True
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+            }
+
+    def _add(self, key: str, path: Path, size: int, inode: int):
+        self._entries[key] = (path, size, inode)
+        links = self._links.get(inode, 0)
+        self._links[inode] = links + 1
+        if not links:
+            self._total_bytes += size
+
+    def _forget(self, key: str):
+        path, size, inode = self._entries.pop(key)
+        links = self._links.pop(inode) - 1
+        if links:
+            self._links[inode] = links
+        else:
+            self._total_bytes -= size
+        shutil.rmtree(path.parent, ignore_errors=True)
+
+    def _evict(self):
+        while self._total_bytes > self._max_bytes and self._entries:
+            key = next(iter(self._entries))
+            self._forget(key)
+            self.evictions += 1
+
+
+def link_or_copy(src: str | Path, dst: str | Path):
+    """Hard-link `src` to `dst`, falling back to a copy across filesystems."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
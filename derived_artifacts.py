@@ -0,0 +1,70 @@
+import sys
+import json
+import hashlib
+import inspect
+import logging
+import functools
+from pathlib import Path
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_DERIVED_PREFIX = "derived"
+
+_PROJECT_ROOT = Path(__file__).resolve().parent
+
+
+@functools.lru_cache(maxsize=None)
+def code_version(fn) -> str:
+    """
+    Digest of the GDAL build and of the source of every project module the
+    transform depends on (its own module and, transitively, the project modules
+    it imports, such as gdal_profiles or activities.overviews), so a change to
+    any of them or an upgraded GDAL never serves a stale artifact.
+    """
+    from osgeo import gdal
+
+    digest = hashlib.sha256(gdal.__version__.encode())
+    for name, path in sorted(_project_modules(sys.modules[fn.__module__], {}).items()):
+        digest.update(name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def _project_modules(module, found: dict[str, Path]) -> dict[str, Path]:
+    source = getattr(module, "__file__", None)
+    if module.__name__ in found or source is None or _PROJECT_ROOT not in Path(source).resolve().parents:
+        return found
+
+    found[module.__name__] = Path(source)
+    for value in vars(module).values():
+        dependency = value if inspect.ismodule(value) else sys.modules.get(getattr(value, "__module__", None) or "")
+        if dependency is not None:
+            _project_modules(dependency, found)
+    return found
+
+
+def source_key(kind: str, **fields) -> str:
+    """Content key for bytes fetched from an external source, e.g. a MOSDAC file version or a granule."""
+    material = json.dumps(fields, sort_keys=True, default=str)
+    return f"{kind}:{hashlib.sha256(material.encode()).hexdigest()[:32]}"
+
+
+def derived_key(fn, input_identities: list[str], params: dict) -> str:
+    """
+    Deterministic key for the output of `fn` over inputs (by content identity, in
+    order) with `params`. Outputs are stored with this key as their own content
+    key, so keys chain through multi-step pipelines.
+    """
+    material = json.dumps({
+        "transform": f"{fn.__module__}.{fn.__qualname__}",
+        "code_version": code_version(fn),
+        "inputs": input_identities,
+        "params": params,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+def derived_blob(prefix: str, activity_name: str, key: str, output_name: str) -> str:
+    return f"{prefix}/{activity_name}/{key}/{output_name}"
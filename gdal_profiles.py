@@ -0,0 +1,90 @@
+import os
+import time
+import logging
+import configparser
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+PROFILE_SECTION_PREFIX = "gdal_profile:"
+
+# GTiff creation defaults travel to the raster worker processes as environment
+# variables under this prefix, alongside GDAL's own config options.
+GTIFF_ENV_PREFIX = "GEOSPATIAL_GTIFF_"
+GTIFF_DEFAULTS = {"COMPRESS": "DEFLATE", "BLOCKSIZE": "512", "NUM_THREADS": "ALL_CPUS"}
+
+
+def load_profile(config: configparser.ConfigParser, name: str) -> dict[str, str]:
+    section = f"{PROFILE_SECTION_PREFIX}{name}"
+    if not config.has_section(section):
+        available = [s[len(PROFILE_SECTION_PREFIX):] for s in config.sections() if s.startswith(PROFILE_SECTION_PREFIX)]
+        error_msg = f"Unknown GDAL profile '{name}'. Available profiles: {', '.join(available)}"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    return dict(config[section])
+
+
+def apply_profile(profile: dict[str, str]):
+    """
+    Apply a profile to this process and every raster worker it spawns later.
+
+    Keys prefixed `gtiff_` become GTiff creation defaults; everything else is a
+    GDAL config option (GDAL_CACHEMAX, VSI_CACHE, ...). Options are exported as
+    environment variables, which GDAL reads and spawned processes inherit.
+    """
+    for key, value in profile.items():
+        if key.startswith("gtiff_"):
+            os.environ[GTIFF_ENV_PREFIX + key[len("gtiff_"):].upper()] = value
+        else:
+            os.environ[key.upper()] = value
+
+    logger.info(f"Applied GDAL profile: {profile}")
+
+
+def gtiff_creation_options(compress=None, num_threads=None, cog=False) -> list[str]:
+    """Tiled creation options for GTiff (or COG) output using the active profile's defaults."""
+    def setting(name):
+        return os.environ.get(GTIFF_ENV_PREFIX + name, GTIFF_DEFAULTS[name])
+
+    block_size = setting("BLOCKSIZE")
+    if cog:
+        options = [f"BLOCKSIZE={block_size}"]
+    else:
+        options = ["TILED=YES", f"BLOCKXSIZE={block_size}", f"BLOCKYSIZE={block_size}"]
+
+    return options + [
+        f"COMPRESS={compress or setting('COMPRESS')}",
+        f"NUM_THREADS={num_threads or setting('NUM_THREADS')}",
+        "BIGTIFF=IF_SAFER",
+    ]
+
+
+def with_gdal_config(options: dict[str, str], fn, *args, **kwargs):
+    """Call `fn` with extra GDAL config options set for the duration of the call."""
+    from osgeo import gdal
+
+    with gdal.config_options(options):
+        return fn(*args, **kwargs)
+
+
+def unopenable(paths: list[str]) -> list[str]:
+    """The paths GDAL cannot open as rasters, e.g. /vsiaz/ paths failing on auth or HTTP."""
+    from osgeo import gdal
+
+    return [path for path in paths if gdal.OpenEx(path, gdal.OF_RASTER | gdal.OF_READONLY) is None]
+
+
+def warm_up() -> float:
+    """Import the heavy native libraries and register GDAL drivers; returns seconds taken."""
+    start = time.perf_counter()
+
+    import numpy  # noqa: F401
+    from osgeo import gdal, ogr, osr  # noqa: F401
+    from pyhdf.SD import SD  # noqa: F401
+    gdal.AllRegister()
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"🔥 Raster libraries warmed up in {elapsed:.2f}s (pid {os.getpid()})")
+    return elapsed
@@ -5,11 +5,14 @@ import logging
 import configparser
 
 from azure_storage import AzureStorage
+from gdal_profiles import load_profile, apply_profile
+from telemetry import MetricsRegistry, FileExporter, PerformanceInterceptor, start_http_exporter
 
 from temporalio.worker import Worker
 from utils import connect_with_backoff
 from workflows.fapar import ProcessFapar
 from workflows.mosdac import ProcessMosdac
+from workflows.task_queues import ACTIVITY_ROLES, WORKFLOW_ROLE, IO_ROLE, RASTER_ROLE, role_task_queue
 
 from activities.geo_spatial_activities import GeoSpatialActivities
 
@@ -28,23 +31,89 @@ async def main():
 
     temporal_host = env_config["temporal_host_port"]
 
+    # Applied before the raster process pool exists so spawned workers inherit it.
+    apply_profile(load_profile(config, os.getenv("GDAL_PROFILE", env_config.get("gdal_profile", "default"))))
+
     azure_storage = AzureStorage(env_config)
     geo_spatial_activities = GeoSpatialActivities(env_config, azure_storage)
 
+    # WORKER_ROLES lets one image be deployed as separate io / raster / workflow pools.
+    roles = [r.strip() for r in os.getenv("WORKER_ROLES", env_config.get("worker_roles", "")).split(",") if r.strip()]
+    roles = roles or [WORKFLOW_ROLE, IO_ROLE, RASTER_ROLE]
+    base_task_queue = env_config.get("task_queue", "GeoSpatialAnalysisQueue")
+
+    activities = {
+        "download_mosdac_data": geo_spatial_activities.download_mosdac_data,
+        "cloud_optimize_tiff": geo_spatial_activities.cloud_optimize_tiff,
+        "scale_tiff": geo_spatial_activities.scale_tif,
+        "compose_tiffs": geo_spatial_activities.compose_tifs,
+        "scale_and_compose_tiffs": geo_spatial_activities.scale_and_compose_tifs,
+        "download_fapar_data": geo_spatial_activities.download_fapar_data,
+        "convert_hdf_to_geotiff": geo_spatial_activities.convert_hdf_to_geotiff,
+        "append_fapar_datacube": geo_spatial_activities.append_fapar_datacube,
+        "zonal_stats": geo_spatial_activities.zonal_stats,
+    }
+
+    if env_config.get("gdal_warm_up", "false").lower() == "true":
+        await geo_spatial_activities.warm_up(io=IO_ROLE in roles, raster=RASTER_ROLE in roles)
+
     client = await connect_with_backoff(temporal_host)
-    worker = Worker(
-        client,
-        task_queue="GeoSpatialAnalysisQueue",
-        workflows=[ProcessMosdac, ProcessFapar],
-        activities=[geo_spatial_activities.download_mosdac_data,
-                    geo_spatial_activities.scale_tif,
-                    geo_spatial_activities.compose_tifs,
-                    geo_spatial_activities.download_fapar_data,
-                    geo_spatial_activities.convert_hdf_to_geotiff],
-    )
+    interceptors = build_interceptors(env_config, azure_storage)
+    workers = []
+    for role in roles:
+        task_queue = role_task_queue(base_task_queue, role)
+        role_activities = [fn for name, fn in activities.items() if ACTIVITY_ROLES[name] == role]
+        workers.append(Worker(
+            client,
+            task_queue=task_queue,
+            interceptors=interceptors,
+            workflows=[ProcessMosdac, ProcessFapar] if role == WORKFLOW_ROLE else [],
+            activities=role_activities,
+            **worker_limits(env_config, role),
+        ))
+        logger.info(f"Worker role '{role}' polling {task_queue}")
 
     logger.info("🚀 Starting Temporal Worker...")
-    await worker.run()
+    try:
+        await asyncio.gather(*[worker.run() for worker in workers])
+    finally:
+        geo_spatial_activities.shutdown()
+
+
+def worker_limits(env_config: dict[str, str], role: str) -> dict[str, int]:
+    """Per-role Worker concurrency from config.ini; 0 means one slot per CPU core."""
+    limits = {}
+    for setting in ("max_concurrent_activities", "max_concurrent_workflow_tasks"):
+        value = env_config.get(f"{role}_{setting}")
+        if value is not None:
+            limits[setting] = int(value) or os.cpu_count()
+    return limits
+
+
+def build_interceptors(env_config: dict[str, str], azure_storage: AzureStorage) -> list:
+    interceptors = []
+
+    # Optional OpenTelemetry spans; outermost so the performance interceptor runs inside the span.
+    if env_config.get("telemetry_tracing", "false").lower() == "true":
+        try:
+            from temporalio.contrib.opentelemetry import TracingInterceptor
+            interceptors.append(TracingInterceptor())
+        except ImportError:
+            logger.warning("telemetry_tracing is enabled but opentelemetry is not installed")
+
+    registry = MetricsRegistry()
+    for stat in ("hits", "misses", "evictions", "entries", "bytes"):
+        registry.register_gauge(f"blob_cache_{stat}", f"Local blob cache {stat} (counts since worker start)",
+                                lambda stat=stat: azure_storage.cache_stats().get(stat, 0))
+    exporter = FileExporter(registry,
+                            json_path=env_config.get("telemetry_json_path"),
+                            text_path=env_config.get("telemetry_text_path"))
+    metrics_port = int(env_config.get("telemetry_http_port", 0))
+    if metrics_port:
+        start_http_exporter(registry, metrics_port)
+
+    interceptors.append(PerformanceInterceptor(registry, exporter))
+    return interceptors
 
 
 if __name__ == '__main__':
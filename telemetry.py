@@ -0,0 +1,304 @@
+import json
+import time
+import logging
+import resource
+import threading
+import contextvars
+from pathlib import Path
+from typing import Callable
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from temporalio import activity
+from temporalio.worker import Interceptor, ActivityInboundInterceptor, ExecuteActivityInput
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "geospatial_activity"
+WORKER_METRIC_PREFIX = "geospatial_worker"
+
+# Counters accumulated per activity run, with their Prometheus help text.
+COUNTERS = {
+    "wall_seconds": "Wall-clock time spent in activities",
+    "cpu_seconds": "CPU time spent on behalf of activities, including raster worker processes",
+    "blob_downloaded_bytes": "Bytes downloaded from blob storage",
+    "blob_uploaded_bytes": "Bytes uploaded to blob storage",
+    "blob_cache_hits": "Blob downloads served from the local blob cache",
+    "blob_cache_misses": "Blob downloads that missed the local blob cache",
+    "sftp_bytes": "Bytes fetched from the MOSDAC SFTP server",
+    "earthdata_bytes": "Bytes fetched from NASA Earthdata",
+    "raster_pixels": "Raster pixels (width x height x bands) processed",
+    "scratch_bytes": "Scratch disk bytes held by activity workspaces at release",
+}
+
+_current_metrics: contextvars.ContextVar["ActivityMetrics | None"] = contextvars.ContextVar(
+    "current_activity_metrics", default=None)
+
+
+class ActivityMetrics:
+    """Performance numbers for one activity execution."""
+
+    def __init__(self, activity_name: str):
+        self.activity_name = activity_name
+        self.status = "running"
+        self.counters = {name: 0.0 for name in COUNTERS}
+        self.peak_rss_bytes = 0
+        self.rasters: list[tuple[int, int, int]] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, amount: float):
+        with self._lock:
+            self.counters[name] += amount
+
+    def merge(self, other: dict):
+        """Fold in metrics measured in another process (see `run_measured`)."""
+        with self._lock:
+            for name, amount in other["counters"].items():
+                self.counters[name] += amount
+            self.peak_rss_bytes = max(self.peak_rss_bytes, other["peak_rss_bytes"])
+            self.rasters.extend(tuple(r) for r in other["rasters"])
+
+    def as_dict(self) -> dict:
+        return {
+            "activity": self.activity_name,
+            "status": self.status,
+            **self.counters,
+            "peak_rss_bytes": self.peak_rss_bytes,
+            "rasters": self.rasters,
+        }
+
+
+def add(name: str, amount: float):
+    """Add to a counter of the activity running in the current context, if any."""
+    metrics = _current_metrics.get()
+    if metrics is not None:
+        metrics.add(name, amount)
+
+
+def observe_raster(width: int, height: int, bands: int = 1):
+    metrics = _current_metrics.get()
+    if metrics is not None:
+        metrics.add("raster_pixels", width * height * bands)
+        with metrics._lock:
+            metrics.rasters.append((width, height, bands))
+
+
+@contextmanager
+def collect(activity_name: str):
+    metrics = ActivityMetrics(activity_name)
+    token = _current_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current_metrics.reset(token)
+
+
+def run_timed(fn, *args):
+    """Run `fn` on the calling thread and charge its thread CPU time to the current activity."""
+    start = time.thread_time()
+    try:
+        return fn(*args)
+    finally:
+        add("cpu_seconds", time.thread_time() - start)
+
+
+def run_measured(fn, *args):
+    """
+    Process-pool entry point: run `fn` and return (result, metrics dict) so the
+    parent can merge CPU time, peak RSS and raster sizes measured in the child.
+    """
+    _reset_peak_rss()
+    with collect(getattr(fn, "__name__", "raster")) as metrics:
+        start = time.process_time()
+        result = fn(*args)
+        metrics.add("cpu_seconds", time.process_time() - start)
+        metrics.peak_rss_bytes = _peak_rss_bytes()
+        return result, {"counters": metrics.counters, "peak_rss_bytes": metrics.peak_rss_bytes,
+                        "rasters": metrics.rasters}
+
+
+def merge_measured(measured: dict):
+    metrics = _current_metrics.get()
+    if metrics is not None:
+        metrics.merge(measured)
+
+
+def _peak_rss_bytes() -> int:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _reset_peak_rss():
+    # Linux lets a process reset its own high-water mark, so long-lived pool
+    # workers report the peak of the current call rather than of their lifetime.
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+class MetricsRegistry:
+    """
+    Aggregates activity metrics and renders them in Prometheus text format,
+    together with worker-level gauges read at render time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[tuple[str, str, str], float] = {}
+        self._runs: dict[tuple[str, str], int] = {}
+        self._peak_rss: dict[str, int] = {}
+        self._gauges: dict[str, tuple[str, Callable[[], float]]] = {}
+
+        # The worker's own high-water mark is never reset, so it is a worker gauge
+        # rather than part of any single activity's numbers.
+        self.register_gauge("peak_rss_bytes", "Lifetime peak RSS of the worker process", _peak_rss_bytes)
+
+    def register_gauge(self, name: str, help_text: str, read: Callable[[], float]):
+        with self._lock:
+            self._gauges[name] = (help_text, read)
+
+    def record(self, metrics: ActivityMetrics):
+        with self._lock:
+            run_key = (metrics.activity_name, metrics.status)
+            self._runs[run_key] = self._runs.get(run_key, 0) + 1
+            for name, amount in metrics.counters.items():
+                key = (name, metrics.activity_name, metrics.status)
+                self._counters[key] = self._counters.get(key, 0.0) + amount
+            self._peak_rss[metrics.activity_name] = max(
+                self._peak_rss.get(metrics.activity_name, 0), metrics.peak_rss_bytes)
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            lines.append(f"# HELP {METRIC_PREFIX}_runs_total Activity executions")
+            lines.append(f"# TYPE {METRIC_PREFIX}_runs_total counter")
+            for (activity_name, status), count in sorted(self._runs.items()):
+                lines.append(f'{METRIC_PREFIX}_runs_total{{activity="{activity_name}",status="{status}"}} {count}')
+
+            for name, help_text in COUNTERS.items():
+                metric = f"{METRIC_PREFIX}_{name}_total"
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} counter")
+                for (counter, activity_name, status), value in sorted(self._counters.items()):
+                    if counter == name:
+                        lines.append(f'{metric}{{activity="{activity_name}",status="{status}"}} {value}')
+
+            metric = f"{METRIC_PREFIX}_peak_rss_bytes"
+            lines.append(f"# HELP {metric} Highest peak RSS of a raster worker process during a single execution")
+            lines.append(f"# TYPE {metric} gauge")
+            for activity_name, value in sorted(self._peak_rss.items()):
+                lines.append(f'{metric}{{activity="{activity_name}"}} {value}')
+
+            gauges = list(self._gauges.items())
+
+        for name, (help_text, read) in gauges:
+            metric = f"{WORKER_METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {read()}")
+
+        return "\n".join(lines) + "\n"
+
+
+class FileExporter:
+    """
+    Offline exporter: appends one JSON line per activity execution to `json_path`
+    and rewrites the Prometheus text snapshot at `text_path` (textfile-collector style).
+    """
+
+    def __init__(self, registry: MetricsRegistry, json_path: str | None = None, text_path: str | None = None):
+        self._registry = registry
+        self._json_path = Path(json_path) if json_path else None
+        self._text_path = Path(text_path) if text_path else None
+        self._lock = threading.Lock()
+
+    def export(self, metrics: ActivityMetrics):
+        with self._lock:
+            if self._json_path:
+                with open(self._json_path, "a") as f:
+                    f.write(json.dumps({"timestamp": time.time(), **metrics.as_dict()}) + "\n")
+            if self._text_path:
+                tmp_path = self._text_path.with_suffix(".tmp")
+                tmp_path.write_text(self._registry.render_prometheus())
+                tmp_path.replace(self._text_path)
+
+
+def start_http_exporter(registry: MetricsRegistry, port: int) -> ThreadingHTTPServer:
+    """Serve the registry at http://0.0.0.0:<port>/metrics from a daemon thread."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics_http", daemon=True).start()
+    logger.info(f"📈 Serving activity metrics on :{port}/metrics")
+    return server
+
+
+class PerformanceInterceptor(Interceptor):
+    """Worker interceptor recording `ActivityMetrics` for every activity execution."""
+
+    def __init__(self, registry: MetricsRegistry, exporter: FileExporter | None = None):
+        self._registry = registry
+        self._exporter = exporter
+
+    def intercept_activity(self, next: ActivityInboundInterceptor) -> ActivityInboundInterceptor:
+        return _PerformanceActivityInbound(next, self._registry, self._exporter)
+
+
+class _PerformanceActivityInbound(ActivityInboundInterceptor):
+    def __init__(self, next: ActivityInboundInterceptor, registry: MetricsRegistry, exporter: FileExporter | None):
+        super().__init__(next)
+        self._registry = registry
+        self._exporter = exporter
+
+    async def execute_activity(self, input: ExecuteActivityInput):
+        with collect(activity.info().activity_type) as metrics:
+            start = time.perf_counter()
+            try:
+                result = await super().execute_activity(input)
+                metrics.status = "completed"
+                return result
+            except BaseException:
+                metrics.status = "failed"
+                raise
+            finally:
+                # peak_rss_bytes only holds what raster child processes measured for this call
+                # (see `run_measured`); the worker's own RSS is the worker-level gauge.
+                metrics.add("wall_seconds", time.perf_counter() - start)
+                self._registry.record(metrics)
+                if self._exporter is not None:
+                    self._exporter.export(metrics)
+                _annotate_span(metrics)
+                logger.info(f"⏱️ {metrics.activity_name} {metrics.status} in "
+                            f"{metrics.counters['wall_seconds']:.2f}s "
+                            f"(cpu {metrics.counters['cpu_seconds']:.2f}s)")
+
+
+def _annotate_span(metrics: ActivityMetrics):
+    # Optional: when OpenTelemetry tracing is enabled, attach the numbers to the activity span.
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        return
+
+    span = trace.get_current_span()
+    if span.is_recording():
+        span.set_attributes({f"geospatial.{name}": value for name, value in metrics.counters.items()})
+        span.set_attribute("geospatial.peak_rss_bytes", metrics.peak_rss_bytes)
@@ -0,0 +1,150 @@
+import os
+
+from blob_cache import BlobCache
+
+
+def write(path, data: bytes):
+    path.write_bytes(data)
+    return path
+
+
+def test_put_then_get_materializes_same_bytes(tmp_path):
+    cache = BlobCache(tmp_path / "cache", max_bytes=1024)
+    src = write(tmp_path / "a.tif", b"raster")
+    cache.put("wf/a.tif", "etag-1", src)
+
+    dst = tmp_path / "out.tif"
+    assert cache.get("wf/a.tif", "etag-1", dst)
+    assert dst.read_bytes() == b"raster"
+    assert cache.stats()["hits"] == 1
+
+
+def test_get_misses_for_other_etag(tmp_path):
+    cache = BlobCache(tmp_path / "cache", max_bytes=1024)
+    cache.put("wf/a.tif", "etag-1", write(tmp_path / "a.tif", b"old"))
+
+    assert not cache.get("wf/a.tif", "etag-2", tmp_path / "out.tif")
+    assert not (tmp_path / "out.tif").exists()
+    assert cache.stats()["misses"] == 1
+
+
+def test_evicts_least_recently_used_first(tmp_path):
+    cache = BlobCache(tmp_path / "cache", max_bytes=8)
+    cache.put("a", "1", write(tmp_path / "a", b"aaaa"))
+    cache.put("b", "1", write(tmp_path / "b", b"bbbb"))
+
+    # Touch a so b becomes the oldest entry
+    assert cache.get("a", "1", tmp_path / "a_out")
+    cache.put("c", "1", write(tmp_path / "c", b"cccc"))
+
+    assert cache.get("a", "1", tmp_path / "a_again")
+    assert cache.get("c", "1", tmp_path / "c_out")
+    assert not cache.get("b", "1", tmp_path / "b_out")
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["entries"] == 2
+    assert stats["bytes"] == 8
+
+
+def test_entry_larger_than_cache_is_not_kept(tmp_path):
+    cache = BlobCache(tmp_path / "cache", max_bytes=4)
+    cache.put("big", "1", write(tmp_path / "big", b"too large"))
+
+    assert not cache.get("big", "1", tmp_path / "out")
+    assert cache.stats()["bytes"] == 0
+
+
+def test_put_replaces_existing_entry_without_double_counting(tmp_path):
+    cache = BlobCache(tmp_path / "cache", max_bytes=1024)
+    cache.put("a", "1", write(tmp_path / "a1", b"first"))
+    cache.put("a", "1", write(tmp_path / "a2", b"second!"))
+
+    assert cache.get("a", "1", tmp_path / "out")
+    assert (tmp_path / "out").read_bytes() == b"second!"
+    assert cache.stats()["bytes"] == len(b"second!")
+
+
+def test_alias_serves_copy_under_new_name_and_etag(tmp_path):
+    cache = BlobCache(tmp_path / "cache", max_bytes=1024)
+    cache.put("granules/x.hdf", "src-etag", write(tmp_path / "x.hdf", b"granule"))
+
+    assert cache.alias("granules/x.hdf", "src-etag", "wf/x.hdf", "dst-etag")
+    dst = tmp_path / "out.hdf"
+    assert cache.get("wf/x.hdf", "dst-etag", dst)
+    assert dst.read_bytes() == b"granule"
+
+
+def test_alias_shares_bytes_with_its_source(tmp_path):
+    cache = BlobCache(tmp_path / "cache", max_bytes=8)
+    cache.put("granules/x.hdf", "src-etag", write(tmp_path / "x.hdf", b"aaaa"))
+    cache.alias("granules/x.hdf", "src-etag", "wf/x.hdf", "dst-etag")
+
+    # Both names are one inode on disk, so there is still room for a second blob
+    assert cache.stats()["bytes"] == 4
+    cache.put("b", "1", write(tmp_path / "b", b"bbbb"))
+    stats = cache.stats()
+    assert stats["entries"] == 3
+    assert stats["evictions"] == 0
+    assert stats["bytes"] == 8
+
+
+def test_bytes_are_released_with_the_last_alias(tmp_path):
+    cache = BlobCache(tmp_path / "cache", max_bytes=1024)
+    cache.put("granules/x.hdf", "src-etag", write(tmp_path / "x.hdf", b"aaaa"))
+    cache.alias("granules/x.hdf", "src-etag", "wf/x.hdf", "dst-etag")
+
+    cache._forget(BlobCache._key("granules/x.hdf", "src-etag"))
+    assert cache.stats()["bytes"] == 4
+    cache._forget(BlobCache._key("wf/x.hdf", "dst-etag"))
+    assert cache.stats()["bytes"] == 0
+
+
+def test_restart_counts_aliases_once(tmp_path):
+    root = tmp_path / "cache"
+    cache = BlobCache(root, max_bytes=1024)
+    cache.put("granules/x.hdf", "src-etag", write(tmp_path / "x.hdf", b"aaaa"))
+    cache.alias("granules/x.hdf", "src-etag", "wf/x.hdf", "dst-etag")
+
+    restarted = BlobCache(root, max_bytes=1024)
+
+    assert restarted.stats()["entries"] == 2
+    assert restarted.stats()["bytes"] == 4
+
+
+def test_alias_of_uncached_source_is_a_no_op(tmp_path):
+    cache = BlobCache(tmp_path / "cache", max_bytes=1024)
+
+    assert not cache.alias("granules/x.hdf", "src-etag", "wf/x.hdf", "dst-etag")
+    assert cache.stats()["entries"] == 0
+
+
+def test_restart_reloads_entries_and_drops_partial_ones(tmp_path):
+    root = tmp_path / "cache"
+    cache = BlobCache(root, max_bytes=1024)
+    cache.put("a", "1", write(tmp_path / "a", b"aaaa"))
+    # A put interrupted by a crash leaves a dot directory behind
+    (root / ".deadbeef.1.tmp").mkdir()
+
+    restarted = BlobCache(root, max_bytes=1024)
+
+    assert restarted.stats()["entries"] == 1
+    assert restarted.get("a", "1", tmp_path / "out")
+    assert not (root / ".deadbeef.1.tmp").exists()
+
+
+def test_restart_keeps_recency_from_mtimes(tmp_path):
+    root = tmp_path / "cache"
+    cache = BlobCache(root, max_bytes=8)
+    cache.put("a", "1", write(tmp_path / "a", b"aaaa"))
+    cache.put("b", "1", write(tmp_path / "b", b"bbbb"))
+    entries = {path.parent.name: path for path, *_ in cache._entries.values()}
+    a_path = entries[BlobCache._key("a", "1")]
+    b_path = entries[BlobCache._key("b", "1")]
+    os.utime(b_path, (1_000, 1_000))
+    os.utime(a_path, (2_000, 2_000))
+
+    # A smaller budget forces eviction on reload; the older entry (b) goes first
+    restarted = BlobCache(root, max_bytes=4)
+
+    assert restarted.get("a", "1", tmp_path / "a_out")
+    assert not restarted.get("b", "1", tmp_path / "b_out")
@@ -0,0 +1,98 @@
+import json
+
+import numpy as np
+import pytest
+
+from activities.fapar_datacube import append_to_datacube, append_working_set, VARIABLE_NAME, ZMETADATA
+
+
+def zmetadata(time_steps, time_chunk=46, dimension_separator=None):
+    array = {"shape": [time_steps, 256, 256], "chunks": [time_chunk, 128, 128]}
+    if dimension_separator is not None:
+        array["dimension_separator"] = dimension_separator
+    return {"metadata": {f"{VARIABLE_NAME}/.zarray": array}}
+
+
+def test_keeps_metadata_and_coordinates():
+    needed = append_working_set(zmetadata(100))
+
+    assert needed(".zmetadata")
+    assert needed(".zgroup")
+    assert needed(f"{VARIABLE_NAME}/.zarray")
+    assert needed(f"{VARIABLE_NAME}/.zattrs")
+    assert needed("time/0")
+    assert needed("x/0")
+
+
+def test_keeps_only_the_trailing_time_chunk():
+    # 100 steps in chunks of 46: chunks 0 and 1 are full, chunk 2 is partially filled
+    needed = append_working_set(zmetadata(100))
+
+    assert not needed(f"{VARIABLE_NAME}/0.0.0")
+    assert not needed(f"{VARIABLE_NAME}/1.1.1")
+    assert needed(f"{VARIABLE_NAME}/2.0.0")
+    assert needed(f"{VARIABLE_NAME}/2.1.1")
+
+
+def test_full_trailing_chunk_needs_no_data():
+    needed = append_working_set(zmetadata(92))
+
+    assert not needed(f"{VARIABLE_NAME}/1.0.0")
+    assert needed(f"{VARIABLE_NAME}/.zarray")
+
+
+def test_nested_chunk_keys():
+    needed = append_working_set(zmetadata(100, dimension_separator="/"))
+
+    assert not needed(f"{VARIABLE_NAME}/1/0/0")
+    assert needed(f"{VARIABLE_NAME}/2/0/0")
+
+
+def write_tiff(path, value):
+    gdal = pytest.importorskip("osgeo.gdal")
+    osr = pytest.importorskip("osgeo.osr")
+
+    ds = gdal.GetDriverByName("GTiff").Create(str(path), 4, 3, 1, gdal.GDT_Float32)
+    ds.SetGeoTransform((0.0, 10.0, 0.0, 30.0, 0.0, -10.0))
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(32643)
+    ds.SetProjection(srs.ExportToWkt())
+    ds.GetRasterBand(1).Fill(value)
+    ds = None
+    return str(path)
+
+
+def test_append_from_working_set_keeps_earlier_dates(tmp_path):
+    xr = pytest.importorskip("xarray")
+    pytest.importorskip("zarr")
+    remote, local = tmp_path / "remote.zarr", tmp_path / "local.zarr"
+    first = [write_tiff(tmp_path / f"a{i}.tif", i) for i in range(3)]
+    append_to_datacube(str(remote), first, ["A2024001", "A2024009", "A2024017"], time_chunk=2, spatial_chunk=2)
+
+    # Like the activity: fetch only the working set, append, push back what changed
+    needed = append_working_set(json.loads(remote.joinpath(ZMETADATA).read_text()))
+    for path in remote.rglob("*"):
+        relative = path.relative_to(remote).as_posix()
+        if path.is_file() and needed(relative):
+            local.joinpath(relative).parent.mkdir(parents=True, exist_ok=True)
+            local.joinpath(relative).write_bytes(path.read_bytes())
+    assert not local.joinpath(VARIABLE_NAME, "0.0.0").exists()
+
+    appended = append_to_datacube(str(local), [write_tiff(tmp_path / "b.tif", 10)], ["A2024025"], 2, 2)
+    for path in local.rglob("*"):
+        if path.is_file():
+            remote.joinpath(path.relative_to(local)).write_bytes(path.read_bytes())
+
+    assert appended == ["A2024025"]
+    cube = xr.open_zarr(remote, consolidated=True)
+    assert cube.sizes["time"] == 4
+    assert [float(cube[VARIABLE_NAME].isel(time=t).mean()) for t in range(4)] == [0.0, 1.0, 2.0, 10.0]
+
+
+def test_existing_store_without_consolidated_metadata_is_rejected(tmp_path):
+    store = tmp_path / "cube.zarr"
+    store.mkdir()
+    store.joinpath("zarr.json").write_text("{}")
+
+    with pytest.raises(ValueError):
+        append_to_datacube(str(store), [], [])
@@ -0,0 +1,18 @@
+from workflows.fapar import group_by_date
+
+
+def test_groups_by_acquisition_date_in_order():
+    hdfs = ["MCD15A2H.A2024369.h25v06.061.x.hdf", "MCD15A2H.A2024361.h25v06.061.x.hdf",
+            "MCD15A2H.A2024361.h26v06.061.x.hdf"]
+
+    assert group_by_date(hdfs, ["c.tif", "a.tif", "b.tif"]) == {
+        "A2024361": ["a.tif", "b.tif"],
+        "A2024369": ["c.tif"],
+    }
+
+
+def test_skips_granules_outside_the_aoi():
+    hdfs = ["MCD15A2H.A2024361.h25v06.061.x.hdf", "MCD15A2H.A2024361.h26v06.061.x.hdf",
+            "MCD15A2H.A2024369.h26v06.061.x.hdf"]
+
+    assert group_by_date(hdfs, ["a.tif", None, None]) == {"A2024361": ["a.tif"]}
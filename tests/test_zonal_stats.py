@@ -0,0 +1,57 @@
+import numpy as np
+
+from activities.zonal_stats import accumulate_zones
+
+
+def accumulators(zone_count):
+    return (np.zeros(zone_count, dtype=np.int64), np.zeros(zone_count),
+            np.full(zone_count, np.inf), np.full(zone_count, -np.inf))
+
+
+def test_reduces_unsorted_labels_per_zone():
+    counts, sums, mins, maxs = accumulators(4)
+    labels = np.array([2, 1, 2, 3, 1, 2])
+    values = np.array([5.0, -1.0, 3.0, 7.0, 4.0, 9.0])
+
+    accumulate_zones(labels, values, counts, sums, mins, maxs)
+
+    assert counts.tolist() == [0, 2, 3, 1]
+    assert sums.tolist() == [0.0, 3.0, 17.0, 7.0]
+    assert mins[1:].tolist() == [-1.0, 3.0, 7.0]
+    assert maxs[1:].tolist() == [4.0, 9.0, 7.0]
+
+
+def test_zone_without_pixels_keeps_initial_extremes():
+    counts, sums, mins, maxs = accumulators(3)
+
+    accumulate_zones(np.array([1, 1]), np.array([2.0, 6.0]), counts, sums, mins, maxs)
+
+    assert counts[2] == 0
+    assert mins[2] == np.inf
+    assert maxs[2] == -np.inf
+
+
+def test_blocks_accumulate_like_one_pass():
+    rng = np.random.default_rng(0)
+    labels = rng.integers(0, 5, size=1000)
+    values = rng.normal(size=1000)
+
+    whole = accumulators(5)
+    accumulate_zones(labels, values, *whole)
+    blocked = accumulators(5)
+    for start in range(0, 1000, 128):
+        accumulate_zones(labels[start:start + 128], values[start:start + 128], *blocked)
+
+    assert whole[0].tolist() == blocked[0].tolist()
+    np.testing.assert_allclose(whole[1], blocked[1])
+    assert whole[2].tolist() == blocked[2].tolist()
+    assert whole[3].tolist() == blocked[3].tolist()
+
+
+def test_empty_block_is_a_no_op():
+    counts, sums, mins, maxs = accumulators(2)
+
+    accumulate_zones(np.array([], dtype=np.int64), np.array([]), counts, sums, mins, maxs)
+
+    assert counts.tolist() == [0, 0]
+    assert mins.tolist() == [np.inf, np.inf]
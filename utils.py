@@ -1,5 +1,7 @@
+import time
 import asyncio
 import random
+import threading
 from temporalio.client import Client
 from datetime import datetime
 
@@ -34,4 +36,30 @@ def validate_date_format(date_string, format_string):
         datetime.strptime(date_string, format_string)
         return True
     except ValueError:
-        return False
\ No newline at end of file
+        return False
+
+
+class TTLCache:
+    """Thread-safe in-memory cache whose entries expire `ttl_seconds` after being set."""
+
+    def __init__(self, ttl_seconds: float):
+        self._ttl_seconds = ttl_seconds
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, ttl_seconds: float | None = None):
+        """Return the cached value, or None if absent or older than `ttl_seconds` (default: the cache TTL)."""
+        ttl_seconds = self._ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > ttl_seconds:
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
@@ -1,35 +1,111 @@
 from temporalio import workflow
+import re
+import asyncio
 import logging
 from datetime import timedelta
 
+from workflows.task_queues import activity_task_queue
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+DEFAULT_MAX_PARALLEL_ACTIVITIES = 16
+
+# MODIS granule names carry the acquisition date as AYYYYDDD, e.g. MCD15A2H.A2024361.h25v06.061.*.hdf
+MODIS_DATE_PATTERN = re.compile(r"\.(A\d{7})\.")
+
 
 @workflow.defn(name="ProcessFapar")
 class ProcessFapar:
     @workflow.run
-    async def run(self, args) -> str:
+    async def run(self, args) -> list[str]:
         logger.info(f"🚨 Workflow Args: {args} ({type(args)})")
         wid = workflow.info().workflow_id
 
-        fapar_data = await workflow.execute_activity(
+        semaphore = asyncio.Semaphore(int(args.get("max_parallel_activities", DEFAULT_MAX_PARALLEL_ACTIVITIES)))
+
+        async def run_activity(name, activity_args):
+            async with semaphore:
+                return await workflow.execute_activity(
+                    name,
+                    task_queue=activity_task_queue(name),
+                    args=activity_args,
+                    start_to_close_timeout=timedelta(seconds=300),
+                )
+
+        fapar_hdfs = await workflow.execute_activity(
             "download_fapar_data",
+            task_queue=activity_task_queue("download_fapar_data"),
             args=[args["start_date"], args["end_date"], args["shape_file_url"]],
             start_to_close_timeout=timedelta(seconds=300),
         )
 
-        geotif_url = await workflow.execute_activity(
-            "convert_hdf_to_geotiff",
-            args=[fapar_data],
-            start_to_close_timeout=timedelta(seconds=300),
-        )
+        # Runs started before the per-granule fan-out replay their single conversion and scale
+        if not workflow.patched("fapar-per-granule"):
+            geotif = await run_activity("convert_hdf_to_geotiff", [fapar_hdfs])
+            rescaled_tif = await run_activity("scale_tiff", [geotif, args["scale_factor"]])
+            return [f"{wid}/{rescaled_tif}"]
 
-        rescaled_tif = await workflow.execute_activity(
-            "scale_tiff",
-            args=[geotif_url, args["scale_factor"]],
-            start_to_close_timeout=timedelta(seconds=300),
-        )
+        # Convert every granule concurrently, cropped to the AOI unless disabled
+        aoi_shape_file = args["shape_file_url"] if args.get("crop_to_aoi", True) else None
+        mask_outside_aoi = args.get("mask_outside_aoi", False)
+        geotifs = await asyncio.gather(*[
+            run_activity("convert_hdf_to_geotiff", [fapar_hdf, "Fpar_500m", aoi_shape_file, mask_outside_aoi])
+            for fapar_hdf in fapar_hdfs
+        ])
+
+        # Mosaic the tiles of each date, then rescale each mosaic. Granules whose tile
+        # misses the AOI convert to None and are left out of their date's mosaic.
+        async def process_date(date, date_geotifs):
+            mosaic = date_geotifs[0]
+            if len(date_geotifs) > 1:
+                mosaic = await run_activity("compose_tiffs", [date_geotifs, f"fapar_{date}.tif"])
+
+            return await run_activity(
+                "scale_tiff", [mosaic, args["scale_factor"], args.get("resampling", "bilinear")])
+
+        by_date = group_by_date(fapar_hdfs, geotifs)
+        rescaled_tifs = await asyncio.gather(*[
+            process_date(date, date_geotifs) for date, date_geotifs in by_date.items()
+        ])
+
+        # Append every date to the AOI's time-series cube so analysts read one store, not one TIFF per date.
+        # Gated so runs started before this step replay without it.
+        if args.get("datacube", True) and workflow.patched("fapar-datacube"):
+            cube_name = args.get("datacube_name") or f"fapar_{shape_file_stem(args['shape_file_url'])}"
+            cube = await run_activity("append_fapar_datacube", [cube_name, rescaled_tifs, list(by_date)])
+            logger.info(f"🧊 FAPAR datacube updated: {cube}")
+
+        outputs = [f"{wid}/{rescaled_tif}" for rescaled_tif in rescaled_tifs]
+
+        # Optional per-polygon statistics of every date, one table per date
+        if args.get("zonal_stats", False):
+            tables = await asyncio.gather(*[
+                run_activity("zonal_stats", [rescaled_tif, args["shape_file_url"], args.get("zone_field"),
+                                             args.get("zonal_stats_format", "parquet")])
+                for rescaled_tif in rescaled_tifs
+            ])
+            outputs += [f"{wid}/{table}" for table in tables]
+
+        return outputs
+
+
+def shape_file_stem(shape_file_url: str) -> str:
+    return shape_file_url.rsplit("/", 1)[-1].split(".", 1)[0]
+
+
+def group_by_date(hdf_names: list[str], geotifs: list[str]) -> dict[str, list[str]]:
+    """
+    Group converted GeoTIFFs by the acquisition date of their source granule, in date
+    order. Granules without a GeoTIFF (None) are skipped; a date with none is dropped.
+    """
+    groups: dict[str, list[str]] = {}
+    for hdf_name, geotif in zip(hdf_names, geotifs):
+        if geotif is None:
+            continue
+        match = MODIS_DATE_PATTERN.search(hdf_name)
+        date = match.group(1) if match else hdf_name
+        groups.setdefault(date, []).append(geotif)
 
-        return f"{wid}/{rescaled_tif}"
+    return dict(sorted(groups.items()))
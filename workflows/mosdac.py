@@ -1,11 +1,16 @@
 from temporalio import workflow
 from datetime import timedelta
+import asyncio
 import logging
 
+from workflows.task_queues import activity_task_queue
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+DEFAULT_MAX_PARALLEL_SCALE = 16
+
 
 @workflow.defn(name="ProcessMosdac")
 class ProcessMosdac:
@@ -17,23 +22,61 @@ class ProcessMosdac:
         # Step 1: Download the data
         input_folder = await workflow.execute_activity(
             "download_mosdac_data",
-            args=[args["remote_path"]],
+            task_queue=activity_task_queue("download_mosdac_data"),
+            args=[args["remote_path"], args.get("incremental", True)],
             start_to_close_timeout=timedelta(seconds=3000),
         )
 
-        # Step 2: Scale the TIFF files
-        scaled_urls = []
-        for file_path in input_folder:
-            scaled_url = await workflow.execute_activity(
-                "scale_tiff",
-                args=[file_path, args["scale_factor"]],
+        semaphore = asyncio.Semaphore(int(args.get("max_parallel_scale", DEFAULT_MAX_PARALLEL_SCALE)))
+
+        # Step 1b: Add overview pyramids on the raster queue (a no-op unless the workers
+        # enable write_overviews) so common scale factors are copied instead of warped.
+        async def cloud_optimize(file_path):
+            async with semaphore:
+                return await workflow.execute_activity(
+                    "cloud_optimize_tiff",
+                    task_queue=activity_task_queue("cloud_optimize_tiff"),
+                    args=[file_path],
+                    start_to_close_timeout=timedelta(seconds=3000),
+                )
+
+        # Gated so runs started before this step replay without it.
+        if args.get("overviews", True) and workflow.patched("mosdac-cloud-optimize"):
+            input_folder = list(await asyncio.gather(*[cloud_optimize(file_path) for file_path in input_folder]))
+
+        # Fused mode: scale on the fly while composing, without per-file intermediates
+        if args.get("fused", False):
+            output_tiff = await workflow.execute_activity(
+                "scale_and_compose_tiffs",
+                task_queue=activity_task_queue("scale_and_compose_tiffs"),
+                args=[input_folder, args["scale_factor"], args.get("resampling", "bilinear"),
+                      args.get("debug_intermediates", False)],
                 start_to_close_timeout=timedelta(seconds=3000),
             )
-            scaled_urls.append(scaled_url)
+            return f"{wid}/{output_tiff}"
+
+        # Step 2: Scale the TIFF files concurrently, at most `max_parallel_scale` in flight.
+        # gather() keeps results in input order for compose_tiffs.
+
+        async def scale(file_path):
+            async with semaphore:
+                return await workflow.execute_activity(
+                    "scale_tiff",
+                    task_queue=activity_task_queue("scale_tiff"),
+                    args=[file_path, args["scale_factor"], args.get("resampling", "bilinear")],
+                    start_to_close_timeout=timedelta(seconds=3000),
+                )
+
+        # Runs started before the fan-out replay their one-at-a-time history unchanged.
+        if workflow.patched("mosdac-concurrent-scale"):
+            scaled_urls = list(await asyncio.gather(*[scale(file_path) for file_path in input_folder]))
+        else:
+            scaled_urls = [await scale(file_path) for file_path in input_folder]
 
         # Step 3: Compose the scaled TIFFs
         output_tiff = await workflow.execute_activity(
             "compose_tiffs",
+            task_queue=activity_task_queue("compose_tiffs"),
             args=[scaled_urls],
             start_to_close_timeout=timedelta(seconds=3000),
         )
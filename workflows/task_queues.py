@@ -0,0 +1,29 @@
+from temporalio import workflow
+
+# Worker roles. Workflows are polled on the base task queue; each activity role
+# gets its own queue "<base>-<role>" so I/O-bound and raster workers can be
+# sized and scaled independently.
+WORKFLOW_ROLE = "workflow"
+IO_ROLE = "io"
+RASTER_ROLE = "raster"
+
+ACTIVITY_ROLES = {
+    "download_mosdac_data": IO_ROLE,
+    "download_fapar_data": IO_ROLE,
+    "cloud_optimize_tiff": RASTER_ROLE,
+    "scale_tiff": RASTER_ROLE,
+    "compose_tiffs": RASTER_ROLE,
+    "scale_and_compose_tiffs": RASTER_ROLE,
+    "convert_hdf_to_geotiff": RASTER_ROLE,
+    "append_fapar_datacube": RASTER_ROLE,
+    "zonal_stats": RASTER_ROLE,
+}
+
+
+def role_task_queue(base_task_queue: str, role: str) -> str:
+    return base_task_queue if role == WORKFLOW_ROLE else f"{base_task_queue}-{role}"
+
+
+def activity_task_queue(activity_name: str) -> str:
+    """Task queue for an activity, derived from the running workflow's own queue."""
+    return role_task_queue(workflow.info().task_queue, ACTIVITY_ROLES[activity_name])
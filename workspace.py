@@ -0,0 +1,101 @@
+import os
+import shutil
+import socket
+import logging
+import tempfile
+from pathlib import Path
+from contextlib import contextmanager
+
+import telemetry
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class WorkspaceQuotaExceeded(RuntimeError):
+    pass
+
+
+class Workspace:
+    """Scratch directory owned by a single activity execution."""
+
+    def __init__(self, path: Path, quota_bytes: int):
+        self.path = path
+        self._quota_bytes = quota_bytes
+
+    def bytes_used(self) -> int:
+        total = 0
+        for dir_path, _, file_names in os.walk(self.path):
+            for file_name in file_names:
+                try:
+                    total += os.lstat(os.path.join(dir_path, file_name)).st_size
+                except FileNotFoundError:
+                    pass
+        return total
+
+    def check_quota(self):
+        """
+        Fail the activity if the workspace has grown past its quota.
+
+        This is a post-hoc check, run after each step that writes to the workspace:
+        it stops an activity from carrying on (and uploading) with an oversized
+        scratch footprint, but it cannot prevent a single step from filling the disk.
+        """
+        used = self.bytes_used()
+        if used > self._quota_bytes:
+            error_msg = f"Workspace {self.path} uses {used} bytes, over its quota of {self._quota_bytes}"
+            logger.error(error_msg)
+            raise WorkspaceQuotaExceeded(error_msg)
+
+
+class WorkspaceManager:
+    """
+    Hands out per-activity workspaces under `root` (ideally tmpfs or local NVMe)
+    and removes them when the activity finishes, successfully or not.
+
+    Each worker process gets its own subdirectory, named by hostname and PID so
+    containers sharing one scratch volume (all running as PID 1) never collide.
+    At startup, directories of this host left behind by processes that are no
+    longer running are removed; other hosts' directories are left alone.
+    """
+
+    def __init__(self, root: str | Path, quota_bytes: int):
+        self._root = Path(root)
+        self._root.mkdir(parents=True, exist_ok=True)
+        self._quota_bytes = quota_bytes
+
+        self._hostname = socket.gethostname()
+        self._remove_stale_worker_dirs()
+        self._worker_root = self._root.joinpath(f"worker_{self._hostname}_{os.getpid()}")
+        self._worker_root.mkdir(exist_ok=True)
+
+    def _remove_stale_worker_dirs(self):
+        for worker_dir in self._root.glob(f"worker_{self._hostname}_*"):
+            host_part, _, pid_part = worker_dir.name.rpartition("_")
+            if host_part != f"worker_{self._hostname}" or not pid_part.isdigit():
+                continue
+            pid = int(pid_part)
+            # Our own PID can only be a previous incarnation of this container: we haven't created ours yet.
+            if pid != os.getpid():
+                try:
+                    os.kill(pid, 0)
+                    continue
+                except ProcessLookupError:
+                    pass
+                except PermissionError:
+                    # Alive, owned by another user
+                    continue
+            logger.info(f"Removing stale scratch directory {worker_dir}")
+            shutil.rmtree(worker_dir, ignore_errors=True)
+
+    @contextmanager
+    def open(self, name: str):
+        workspace = Workspace(Path(tempfile.mkdtemp(prefix=f"{name}_", dir=self._worker_root)), self._quota_bytes)
+        try:
+            yield workspace
+        finally:
+            used = workspace.bytes_used()
+            telemetry.add("scratch_bytes", used)
+            logger.info(f"🧹 Releasing workspace {workspace.path} ({used / (1024 * 1024):.1f} MB used)")
+            shutil.rmtree(workspace.path, ignore_errors=True)